@@ -1,17 +1,23 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime, timedelta
 import argparse
+import logging
 import os
 import numpy as np
 import matplotlib.dates as mdates
+from matplotlib.collections import LineCollection
+
+from common import open_db
 
 CLOUDFLARE_ASN = 'AS13335 Cloudflare, Inc.'
 MAX_HOSTS = 50  # Maximum number of hosts to show in visualizations
+SQL_CHUNK_SIZE = 50_000  # Rows per chunk when streaming query results
 VISUALIZATION_DIR = 'visualizations'  # Directory for saving visualizations
 
 # Ensure visualization directory exists
@@ -19,11 +25,11 @@ os.makedirs(VISUALIZATION_DIR, exist_ok=True)
 
 def create_ip_flow_diagram(df_migrations, df_cloudflare_stats, asn_names):
     """Create a flow diagram showing hostname migrations over time."""
-    print("DEBUG: Starting hostname flow diagram creation")
+    logging.debug("Starting hostname flow diagram creation")
     
     # Get unique hostnames and sort by most recent activity
     unique_hostnames = df_migrations['hostname'].unique()
-    print(f"DEBUG: Found {len(df_migrations)} migrations among {len(unique_hostnames)} hostnames")
+    logging.debug(f"Found {len(df_migrations)} migrations among {len(unique_hostnames)} hostnames")
     
     # Split hostnames into chunks of 10
     chunk_size = 10
@@ -31,79 +37,74 @@ def create_ip_flow_diagram(df_migrations, df_cloudflare_stats, asn_names):
     
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     
+    # Create one color map for ASNs so colors stay consistent across parts
+    asn_index = pd.Index(pd.unique(pd.concat([df_migrations['from_asn'], df_migrations['to_asn']])))
+    colors = plt.cm.tab20(np.linspace(0, 1, len(asn_index)))
+    
     for chunk_idx, hostname_chunk in enumerate(hostname_chunks):
         # Filter migrations for current chunk
         chunk_migrations = df_migrations[df_migrations['hostname'].isin(hostname_chunk)]
         
         # Calculate time range
-        min_time = pd.to_datetime(chunk_migrations['start_time'])
-        max_time = pd.to_datetime(chunk_migrations['next_end_time'])
-        time_range = (max_time.max() - min_time.min()).total_seconds() / 3600  # hours
+        min_time = chunk_migrations['start_time'].min()
+        max_time = chunk_migrations['next_end_time'].max()
+        time_range = (max_time - min_time).total_seconds() / 3600  # hours
         
         # Calculate figure dimensions - scale width based on time range
         width_per_hour = 100  # pixels per hour
         fig_width = max(1200, min(time_range * width_per_hour, 4000))  # cap between 1200 and 4000 pixels
         fig_height = 100 * len(hostname_chunk)  # 100 pixels per hostname
         
-        plt.figure(figsize=(fig_width/100, fig_height/100))  # Convert pixels to inches (assuming 100 DPI)
+        fig, ax = plt.subplots(figsize=(fig_width/100, fig_height/100))  # Convert pixels to inches (assuming 100 DPI)
         
-        # Create color map for ASNs
-        unique_asns = pd.concat([chunk_migrations['from_asn'], chunk_migrations['to_asn']]).unique()
-        colors = plt.cm.tab20(np.linspace(0, 1, len(unique_asns)))
-        asn_colors = dict(zip(unique_asns, colors))
+        # Map every migration onto its hostname row
+        hostname_rows = {hostname: i for i, hostname in enumerate(hostname_chunk)}
+        y_pos = chunk_migrations['hostname'].map(hostname_rows).to_numpy(dtype=float)
+        x_start = mdates.date2num(chunk_migrations['end_time'])
+        x_end = mdates.date2num(chunk_migrations['next_start_time'])
         
-        # Plot migrations for each hostname
-        for i, hostname in enumerate(hostname_chunk):
-            hostname_migrations = chunk_migrations[chunk_migrations['hostname'] == hostname]
-            
-            # Plot horizontal lines for each ASN period
-            y_pos = i
-            for _, migration in hostname_migrations.iterrows():
-                from_asn = migration['from_asn']
-                to_asn = migration['to_asn']
-                start_time = pd.to_datetime(migration['start_time'])
-                end_time = pd.to_datetime(migration['end_time'])
-                next_start_time = pd.to_datetime(migration['next_start_time'])
-                
-                # Plot ASN transition arrow
-                plt.arrow(mdates.date2num(end_time), y_pos, 
-                         mdates.date2num(next_start_time) - mdates.date2num(end_time), 0,
-                         head_width=0.2, head_length=0.1, fc=asn_colors[from_asn],
-                         ec=asn_colors[to_asn], alpha=0.7)
-                
-                # Add ASN labels
-                from_asn_number = from_asn.split()[0]
-                to_asn_number = to_asn.split()[0]
-                plt.text(mdates.date2num(end_time), y_pos + 0.2,
-                        f"{from_asn_number} → {to_asn_number}", fontsize=8, rotation=45)
-            
-            # Add hostname label
-            plt.text(mdates.date2num(min_time.min()) - 0.5, y_pos,
+        # Look up arrow colors for all migrations at once
+        from_colors = colors[asn_index.get_indexer(chunk_migrations['from_asn'])]
+        to_colors = colors[asn_index.get_indexer(chunk_migrations['to_asn'])]
+        
+        # Plot all ASN transition arrows as one collection plus one set of heads
+        segments = np.stack([np.column_stack([x_start, y_pos]),
+                             np.column_stack([x_end, y_pos])], axis=1)
+        ax.add_collection(LineCollection(segments, colors=from_colors, alpha=0.7, rasterized=True))
+        ax.scatter(x_end, y_pos, marker='>', c=to_colors, alpha=0.7, rasterized=True)
+        
+        # Add ASN labels
+        asn_labels = (chunk_migrations['from_asn'].str.split().str[0] + ' → ' +
+                      chunk_migrations['to_asn'].str.split().str[0])
+        for x, y, label in zip(x_start, y_pos, asn_labels):
+            ax.text(x, y + 0.2, label, fontsize=8, rotation=45)
+        
+        # Add hostname labels
+        for y, hostname in enumerate(hostname_chunk):
+            ax.text(mdates.date2num(min_time) - 0.5, y,
                     hostname, fontsize=8, ha='right')
+        ax.autoscale_view()
         
         # Customize the plot
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d %H:%M'))
-        plt.xticks(rotation=45)
-        plt.grid(True, alpha=0.3)
-        plt.title(f'Hostname ASN Migrations (Part {chunk_idx + 1} of {len(hostname_chunks)})')
-        plt.tight_layout()
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d %H:%M'))
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.grid(True, alpha=0.3)
+        ax.set_title(f'Hostname ASN Migrations (Part {chunk_idx + 1} of {len(hostname_chunks)})')
+        fig.tight_layout()
         
         # Save the figure
         output_path = os.path.join(VISUALIZATION_DIR, f'hostname_migrations_{timestamp}_part{chunk_idx + 1}.png')
-        plt.savefig(output_path, bbox_inches='tight', dpi=100)
-        plt.close()
+        fig.savefig(output_path, bbox_inches='tight', dpi=150)
+        plt.close(fig)
         
-        print(f"DEBUG: Saved part {chunk_idx + 1} of {len(hostname_chunks)}")
+        logging.debug(f"Saved part {chunk_idx + 1} of {len(hostname_chunks)}")
 
 def create_flow_diagram(df_migrations, df_cloudflare_stats, asn_names):
     """Create a flow diagram showing migrations to/from Cloudflare."""
     if len(df_migrations) == 0:
         return
         
-    # Filter migrations to only include hostnames in df_cloudflare_stats
-    recent_hostnames = set(df_cloudflare_stats['hostname'])
-    df_migrations = df_migrations[df_migrations['hostname'].isin(recent_hostnames)]
-    
+    # get_cloudflare_migrations already limits df_migrations to hostnames in df_cloudflare_stats
     # Split migrations into to/from Cloudflare
     to_cloudflare = df_migrations[df_migrations['to_asn'] == CLOUDFLARE_ASN]
     from_cloudflare = df_migrations[df_migrations['from_asn'] == CLOUDFLARE_ASN]
@@ -111,7 +112,7 @@ def create_flow_diagram(df_migrations, df_cloudflare_stats, asn_names):
     if len(to_cloudflare) == 0 and len(from_cloudflare) == 0:
         return
         
-    plt.figure(figsize=(15, 10))
+    fig, ax = plt.subplots(figsize=(15, 10))
     
     # Create positions for ASNs
     all_asns = set(df_migrations['from_asn'].unique()) | set(df_migrations['to_asn'].unique())
@@ -128,37 +129,31 @@ def create_flow_diagram(df_migrations, df_cloudflare_stats, asn_names):
     for asn, pos in zip(non_cloudflare_asns, other_positions):
         asn_positions[asn] = pos
     
+    # Pull each field out as its own array once instead of materializing rows
+    start_ys = df_migrations['from_asn'].map(asn_positions).to_numpy(dtype=float)
+    end_ys = df_migrations['to_asn'].map(asn_positions).to_numpy(dtype=float)
+    arrow_colors = np.where(df_migrations['to_asn'] == CLOUDFLARE_ASN, 'green', 'red')
+    hostnames = df_migrations['hostname'].astype(str).to_numpy()
+    
     # Plot migrations
-    for _, row in df_migrations.iterrows():
-        start_y = asn_positions[row['from_asn']]
-        end_y = asn_positions[row['to_asn']]
-        
-        # Calculate control points for curved arrows
-        mid_x = 0.5
-        if row['to_asn'] == CLOUDFLARE_ASN:
-            color = 'green'
-            label = 'To Cloudflare'
-        else:
-            color = 'red'
-            label = 'From Cloudflare'
-            
-        plt.annotate('',
+    for start_y, end_y, color, hostname in zip(start_ys, end_ys, arrow_colors, hostnames):
+        ax.annotate('',
                     xy=(1, end_y),
                     xytext=(0, start_y),
                     arrowprops=dict(arrowstyle='->',
                                   color=color,
                                   lw=2,
-                                  connectionstyle='arc3,rad=.2'))
+                                  connectionstyle='arc3,rad=.2')).set_rasterized(True)
         
         # Add hostname labels
-        plt.text(-0.1, start_y, row['hostname'],
+        ax.text(-0.1, start_y, hostname,
                 horizontalalignment='right',
                 verticalalignment='center')
     
     # Add ASN labels
     for asn, pos in asn_positions.items():
         asn_label = asn.split()[0]  # Just show AS number
-        plt.text(1.1, pos, asn_label,
+        ax.text(1.1, pos, asn_label,
                 horizontalalignment='left',
                 verticalalignment='center')
     
@@ -167,24 +162,54 @@ def create_flow_diagram(df_migrations, df_cloudflare_stats, asn_names):
         plt.Line2D([0], [0], color='green', label='To Cloudflare', marker='>', linestyle='-'),
         plt.Line2D([0], [0], color='red', label='From Cloudflare', marker='>', linestyle='-')
     ]
-    plt.legend(handles=legend_elements)
+    ax.legend(handles=legend_elements)
     
-    plt.xlim(-0.2, 1.2)
-    plt.ylim(0, total_height + 1)
-    plt.title('Host Migrations To/From Cloudflare')
-    plt.axis('off')
+    ax.set_xlim(-0.2, 1.2)
+    ax.set_ylim(0, total_height + 1)
+    ax.set_title('Host Migrations To/From Cloudflare')
+    ax.set_axis_off()
     
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     output_path = os.path.join(VISUALIZATION_DIR, f'cloudflare_flow_{timestamp}.png')
-    plt.savefig(output_path, bbox_inches='tight')
-    plt.close()
+    fig.savefig(output_path, bbox_inches='tight', dpi=150)
+    plt.close(fig)
 
 def get_cloudflare_migrations():
     """Get data about hostnames that have moved to or from Cloudflare's ASN."""
-    print("DEBUG: Starting get_cloudflare_migrations()")
+    logging.debug("Starting get_cloudflare_migrations()")
     try:
-        conn = sqlite3.connect('dns_results.db')
-        print("DEBUG: Connected to database")
+        conn = open_db()
+        logging.debug("Connected to database")
+        
+        # Get additional Cloudflare-related statistics
+        cloudflare_stats_query = """
+        WITH cloudflare_hosts AS (
+            SELECT DISTINCT
+                hostname,
+                asn,
+                MIN(timestamp) as first_seen,
+                MAX(timestamp) as last_seen,
+                COUNT(*) as total_occurrences,
+                GROUP_CONCAT(DISTINCT ip_address) as ip_addresses
+            FROM dns_results
+            WHERE asn = ?
+            GROUP BY hostname, asn
+        )
+        SELECT
+            hostname,
+            asn,
+            first_seen,
+            last_seen,
+            total_occurrences,
+            ip_addresses
+        FROM cloudflare_hosts
+        ORDER BY last_seen DESC
+        """
+        
+        logging.debug("Executing Cloudflare stats query")
+        df_cloudflare_stats = pd.read_sql_query(cloudflare_stats_query, conn, params=(CLOUDFLARE_ASN,),
+                                                parse_dates=['first_seen', 'last_seen'])
+        logging.debug(f"Found {len(df_cloudflare_stats)} Cloudflare entries")
         
         # Query to get all hostname-ASN associations involving Cloudflare
         migration_query = """
@@ -192,6 +217,7 @@ def get_cloudflare_migrations():
             SELECT DISTINCT
                 hostname,
                 asn,
+                MAX(as_name) as as_name,
                 MIN(timestamp) as first_seen,
                 MAX(timestamp) as last_seen
             FROM dns_results
@@ -199,69 +225,66 @@ def get_cloudflare_migrations():
                 success = 1
                 AND asn IS NOT NULL
             GROUP BY hostname, asn
-            ORDER BY hostname, first_seen
         ),
         migrations AS (
             SELECT 
-                h1.hostname,
-                h1.asn as from_asn,
-                h2.asn as to_asn,
-                h1.first_seen as start_time,
-                h1.last_seen as end_time,
-                h2.first_seen as next_start_time,
-                h2.last_seen as next_end_time
-            FROM hostname_asns h1
-            JOIN hostname_asns h2 ON h1.hostname = h2.hostname 
-                AND h2.first_seen > h1.last_seen
-            WHERE h1.asn != h2.asn
-                AND (h1.asn = ? OR h2.asn = ?)
+                hostname,
+                asn as from_asn,
+                LEAD(asn) OVER w as to_asn,
+                as_name as from_as_name,
+                LEAD(as_name) OVER w as to_as_name,
+                first_seen as start_time,
+                last_seen as end_time,
+                LEAD(first_seen) OVER w as next_start_time,
+                LEAD(last_seen) OVER w as next_end_time
+            FROM hostname_asns
+            WINDOW w AS (PARTITION BY hostname ORDER BY first_seen)
         )
-        SELECT *
+        SELECT
+            hostname,
+            from_asn,
+            to_asn,
+            from_as_name,
+            to_as_name,
+            start_time,
+            end_time,
+            next_start_time,
+            next_end_time
         FROM migrations
+        WHERE to_asn IS NOT NULL
+            AND from_asn != to_asn
+            AND (from_asn = ? OR to_asn = ?)
         ORDER BY start_time DESC
         """
         
-        print(f"DEBUG: Executing migration query with Cloudflare ASN: {CLOUDFLARE_ASN}")
-        df_migrations = pd.read_sql_query(migration_query, conn, params=(CLOUDFLARE_ASN, CLOUDFLARE_ASN))
-        print(f"DEBUG: Found {len(df_migrations)} migrations")
+        logging.debug(f"Executing migration query with Cloudflare ASN: {CLOUDFLARE_ASN}")
+        # Share one hostname dtype between both frames; hostnames without
+        # Cloudflare activity get code -1 when cast, which filters them out
+        hostname_dtype = pd.CategoricalDtype(df_cloudflare_stats['hostname'].unique())
+        df_cloudflare_stats['hostname'] = df_cloudflare_stats['hostname'].astype(hostname_dtype)
         
-        # Get additional Cloudflare-related statistics
-        cloudflare_stats_query = """
-        WITH cloudflare_hosts AS (
-            SELECT DISTINCT
-                hostname,
-                asn,
-                MIN(timestamp) as first_seen,
-                MAX(timestamp) as last_seen,
-                COUNT(*) as total_occurrences,
-                GROUP_CONCAT(DISTINCT ip_address) as ip_addresses
-            FROM dns_results
-            WHERE asn = ?
-            GROUP BY hostname, asn
-        )
-        SELECT *
-        FROM cloudflare_hosts
-        ORDER BY last_seen DESC
-        """
+        # Stream the migrations and keep only hostnames with Cloudflare activity
+        migration_chunks = pd.read_sql_query(migration_query, conn, params=(CLOUDFLARE_ASN, CLOUDFLARE_ASN),
+                                             parse_dates=['start_time', 'end_time', 'next_start_time', 'next_end_time'],
+                                             chunksize=SQL_CHUNK_SIZE)
+        filtered_chunks = []
+        for chunk in migration_chunks:
+            chunk['hostname'] = chunk['hostname'].astype(hostname_dtype)
+            filtered_chunks.append(chunk[chunk['hostname'].cat.codes >= 0])
+        df_migrations = pd.concat(filtered_chunks, ignore_index=True)
+        logging.debug(f"Found {len(df_migrations)} migrations")
         
-        print("DEBUG: Executing Cloudflare stats query")
-        df_cloudflare_stats = pd.read_sql_query(cloudflare_stats_query, conn, params=(CLOUDFLARE_ASN,))
-        print(f"DEBUG: Found {len(df_cloudflare_stats)} Cloudflare entries")
-        
-        # Get ASN names for reference
-        asn_query = """
-        SELECT DISTINCT asn, as_name
-        FROM dns_results
-        WHERE asn IS NOT NULL
-        """
-        
-        print("DEBUG: Getting ASN names")
-        df_asns = pd.read_sql_query(asn_query, conn)
-        asn_names = dict(zip(df_asns['asn'], df_asns['as_name']))
-        print(f"DEBUG: Found {len(asn_names)} unique ASNs")
+        # Take ASN names from the migration rows instead of another scan of dns_results
+        logging.debug("Getting ASN names")
+        asn_names = dict(zip(df_migrations['from_asn'], df_migrations['from_as_name']))
+        asn_names.update(zip(df_migrations['to_asn'], df_migrations['to_as_name']))
+        df_migrations = df_migrations.drop(columns=['from_as_name', 'to_as_name'])
+        for col in ('from_asn', 'to_asn'):
+            df_migrations[col] = df_migrations[col].astype('category')
+        logging.debug(f"Found {len(asn_names)} unique ASNs")
         
         conn.close()
-        print("DEBUG: Database connection closed")
+        logging.debug("Database connection closed")
         return df_migrations, df_cloudflare_stats, asn_names
     except Exception as e:
         print(f"ERROR in get_cloudflare_migrations: {str(e)}")
@@ -272,53 +295,60 @@ def create_migration_timeline(df, output_file='asn_migration_timeline.png'):
         print("No migrations found in the specified time period.")
         return
 
-    plt.figure(figsize=(15, 8))
+    fig, ax = plt.subplots(figsize=(15, 8))
     
     # Get unique ASNs and assign them y-positions
     all_asns = sorted(list(set(df['from_asn'].unique()) | set(df['to_asn'].unique())))
     asn_positions = {asn: i for i, asn in enumerate(all_asns)}
     
-    # Plot horizontal lines for each ASN
-    for asn in all_asns:
-        plt.axhline(y=asn_positions[asn], color='gray', alpha=0.3, linestyle='--')
-        plt.text(-0.1, asn_positions[asn], f'AS{asn}', 
-                transform=plt.gca().get_yaxis_transform(), 
-                ha='right', va='center')
+    # Plot horizontal guide lines and labels for all ASNs at once
+    ax.hlines(list(asn_positions.values()), 0, 1, transform=ax.get_yaxis_transform(),
+              color='gray', alpha=0.3, linestyle='--')
+    ax.set_yticks(list(asn_positions.values()), [f'AS{asn}' for asn in all_asns])
     
-    # Plot migrations
-    colors = plt.cm.tab20(np.linspace(0, 1, len(df['hostname'].unique())))
-    for i, (_, migration) in enumerate(df.iterrows()):
-        color = colors[i % len(colors)]
-        start_pos = asn_positions[migration['from_asn']]
-        end_pos = asn_positions[migration['to_asn']]
-        
-        plt.plot([migration['start_time'], migration['end_time']], 
-                [start_pos, end_pos],
-                '-o', color=color, alpha=0.7, label=migration['hostname'])
+    # Build every migration segment in one pass
+    x0 = mdates.date2num(df['start_time'])
+    x1 = mdates.date2num(df['end_time'])
+    y0 = df['from_asn'].map(asn_positions).to_numpy(dtype=float)
+    y1 = df['to_asn'].map(asn_positions).to_numpy(dtype=float)
+    segments = np.column_stack([x0, y0, x1, y1]).reshape(-1, 2, 2)
+    
+    # Color migrations by hostname
+    hostname_codes, hostnames = pd.factorize(df['hostname'])
+    colors = plt.cm.tab20(np.linspace(0, 1, len(hostnames)))
+    segment_colors = colors[hostname_codes]
     
-    plt.ylabel('ASN')
-    plt.title('ASN Migration Timeline (Last 24 Hours)')
-    plt.xticks(rotation=45)
+    ax.add_collection(LineCollection(segments, colors=segment_colors, alpha=0.7, rasterized=True))
+    ax.scatter(np.concatenate([x0, x1]), np.concatenate([y0, y1]),
+               c=np.concatenate([segment_colors, segment_colors]), alpha=0.7, rasterized=True)
+    ax.xaxis_date()
+    ax.autoscale_view()
     
-    # Adjust legend
-    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
-    plt.tight_layout()
+    ax.set_ylabel('ASN')
+    ax.set_title('ASN Migration Timeline (Last 24 Hours)')
+    ax.tick_params(axis='x', labelrotation=45)
+    
+    # Adjust legend - one entry per hostname rather than per migration
+    legend_elements = [plt.Line2D([0], [0], color=color, marker='o', alpha=0.7, label=hostname)
+                       for hostname, color in zip(hostnames, colors)]
+    ax.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0.)
+    fig.tight_layout()
     
     # Save to visualization directory
     output_path = os.path.join(VISUALIZATION_DIR, output_file)
-    plt.savefig(output_path, bbox_inches='tight', dpi=300)
-    plt.close()
+    fig.savefig(output_path, bbox_inches='tight', dpi=150)
+    plt.close(fig)
 
 def create_visualizations(df_migrations, df_cloudflare_stats, asn_names):
     """Create visualizations focusing on Cloudflare migrations."""
-    print("DEBUG: Starting create_visualizations()")
+    logging.debug("Starting create_visualizations()")
     try:
         if len(df_migrations) == 0 and len(df_cloudflare_stats) == 0:
-            print("DEBUG: No Cloudflare-related migrations or activity found in the dataset")
+            logging.debug("No Cloudflare-related migrations or activity found in the dataset")
             return
             
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        print(f"DEBUG: Using timestamp {timestamp}")
+        logging.debug(f"Using timestamp {timestamp}")
         
         # Create flow diagrams
         create_flow_diagram(df_migrations, df_cloudflare_stats, asn_names)
@@ -326,105 +356,106 @@ def create_visualizations(df_migrations, df_cloudflare_stats, asn_names):
         
         # Create activity timeline
         if len(df_cloudflare_stats) > 0:
-            print("DEBUG: Processing Cloudflare activity timeline")
-            df_cloudflare_stats['first_seen'] = pd.to_datetime(df_cloudflare_stats['first_seen'])
-            df_cloudflare_stats['last_seen'] = pd.to_datetime(df_cloudflare_stats['last_seen'])
-            
-            plt.figure(figsize=(15, 8))
+            logging.debug("Processing Cloudflare activity timeline")
+            fig, ax = plt.subplots(figsize=(15, 8))
             
-            # Plot duration bars for each hostname
-            for idx, row in df_cloudflare_stats.iterrows():
-                plt.barh(y=idx, 
-                        width=(row['last_seen'] - row['first_seen']).total_seconds() / 3600,
-                        left=pd.Timestamp(row['first_seen']).timestamp() / 3600,
-                        height=0.3,
-                        label=row['hostname'])
+            # Plot duration bars for all hostnames in a single call
+            first_hours = mdates.date2num(df_cloudflare_stats['first_seen']) * 24
+            duration_hours = (df_cloudflare_stats['last_seen'] - df_cloudflare_stats['first_seen']).dt.total_seconds() / 3600
+            ax.barh(y=np.arange(len(df_cloudflare_stats)),
+                    width=duration_hours.to_numpy(),
+                    left=first_hours,
+                    height=0.3,
+                    rasterized=True)
             
-            plt.yticks(range(len(df_cloudflare_stats)), df_cloudflare_stats['hostname'], fontsize=8)
-            plt.xlabel('Time (hours)')
-            plt.title(f'Duration of Cloudflare ASN Usage')
-            plt.grid(True, alpha=0.3)
-            plt.tight_layout()
+            ax.set_yticks(range(len(df_cloudflare_stats)), df_cloudflare_stats['hostname'], fontsize=8)
+            ax.set_xlabel('Time (hours)')
+            ax.set_title(f'Duration of Cloudflare ASN Usage')
+            ax.grid(True, alpha=0.3)
+            fig.tight_layout()
             
             output_path = os.path.join(VISUALIZATION_DIR, f'cloudflare_activity_{timestamp}.png')
-            plt.savefig(output_path, bbox_inches='tight')
-            plt.close()
+            fig.savefig(output_path, bbox_inches='tight', dpi=150)
+            plt.close(fig)
             
-            print(f"DEBUG: Saved activity timeline")
+            logging.debug(f"Saved activity timeline")
     except Exception as e:
         print(f"ERROR in create_visualizations: {str(e)}")
         raise
 
 def print_cloudflare_summary(df_migrations, df_cloudflare_stats, asn_names):
     """Print a summary focusing on Cloudflare-related activities."""
-    print("DEBUG: Starting print_cloudflare_summary()")
+    logging.debug("Starting print_cloudflare_summary()")
     try:
         print("\nCloudflare (AS13335) Migration Summary:")
         print("=" * 80)
         
         if len(df_migrations) > 0:
-            # Filter migrations to only include hostnames in df_cloudflare_stats
-            recent_hostnames = set(df_cloudflare_stats['hostname'])
-            df_migrations = df_migrations[df_migrations['hostname'].isin(recent_hostnames)]
-            
+            # get_cloudflare_migrations already limits df_migrations to hostnames in df_cloudflare_stats
             # Analyze migrations to Cloudflare
             to_cloudflare = df_migrations[df_migrations['to_asn'] == CLOUDFLARE_ASN]
             from_cloudflare = df_migrations[df_migrations['from_asn'] == CLOUDFLARE_ASN]
             
-            print(f"\nDEBUG: Found {len(to_cloudflare)} migrations TO Cloudflare")
+            logging.debug(f"Found {len(to_cloudflare)} migrations TO Cloudflare")
             print("\nMigrations TO Cloudflare:")
-            for _, row in to_cloudflare.iterrows():
-                print(f"- {row['hostname']} from {row['from_asn'].split()[0]}")
-                print(f"  Time: {row['next_start_time']}")
+            if len(to_cloudflare) > 0:
+                lines = ('- ' + to_cloudflare['hostname'].astype(str) +
+                         ' from ' + to_cloudflare['from_asn'].astype(str).str.split().str[0] +
+                         '\n  Time: ' + to_cloudflare['next_start_time'].astype(str))
+                print('\n'.join(lines))
             
-            print(f"\nDEBUG: Found {len(from_cloudflare)} migrations FROM Cloudflare")
+            logging.debug(f"Found {len(from_cloudflare)} migrations FROM Cloudflare")
             print("\nMigrations FROM Cloudflare:")
-            for _, row in from_cloudflare.iterrows():
-                print(f"- {row['hostname']} to {row['to_asn'].split()[0]}")
-                print(f"  Time: {row['next_start_time']}")
+            if len(from_cloudflare) > 0:
+                lines = ('- ' + from_cloudflare['hostname'].astype(str) +
+                         ' to ' + from_cloudflare['to_asn'].astype(str).str.split().str[0] +
+                         '\n  Time: ' + from_cloudflare['next_start_time'].astype(str))
+                print('\n'.join(lines))
         
         if len(df_cloudflare_stats) > 0:
             print("\nCloudflare Usage Statistics:")
             print(f"Total unique hostnames using Cloudflare: {len(df_cloudflare_stats)}")
             
             print("\nHostnames Using Cloudflare:")
-            df_cloudflare_stats['duration'] = (pd.to_datetime(df_cloudflare_stats['last_seen']) - 
-                                             pd.to_datetime(df_cloudflare_stats['first_seen']))
+            df_cloudflare_stats['duration'] = df_cloudflare_stats['last_seen'] - df_cloudflare_stats['first_seen']
             
-            for _, row in df_cloudflare_stats.sort_values('duration', ascending=False).iterrows():
-                duration_hours = row['duration'].total_seconds() / 3600
-                print(f"\n- {row['hostname']}")
-                print(f"  Duration: {duration_hours:.2f} hours")
-                print(f"  Total occurrences: {row['total_occurrences']}")
-                print(f"  IP Addresses: {row['ip_addresses']}")
-                print(f"  First seen: {row['first_seen']}")
-                print(f"  Last seen: {row['last_seen']}")
+            # Format the whole block column-wise and print it once
+            by_duration = df_cloudflare_stats.sort_values('duration', ascending=False)
+            duration_hours = by_duration['duration'].dt.total_seconds() / 3600
+            lines = ('\n- ' + by_duration['hostname'].astype(str) +
+                     '\n  Duration: ' + duration_hours.map('{:.2f}'.format) + ' hours' +
+                     '\n  Total occurrences: ' + by_duration['total_occurrences'].astype(str) +
+                     '\n  IP Addresses: ' + by_duration['ip_addresses'].astype(str) +
+                     '\n  First seen: ' + by_duration['first_seen'].astype(str) +
+                     '\n  Last seen: ' + by_duration['last_seen'].astype(str))
+            print('\n'.join(lines))
         
         print("-" * 80)
     except Exception as e:
         print(f"ERROR in print_cloudflare_summary: {str(e)}")
         raise
 
-def get_asn_migrations(conn, hours_ago=24):
+def get_asn_migrations(conn, hours_ago=24, debug=False):
     # First, get the cutoff time
     cutoff_query = "SELECT datetime('now', ?);"
     cutoff_time = pd.read_sql_query(cutoff_query, conn, params=[f'-{hours_ago} hours']).iloc[0, 0]
     print(f"Looking for migrations after: {cutoff_time}")
     
-    # Debug query to show data range
-    debug_query = """
-    SELECT 
-        MIN(timestamp) as earliest,
-        MAX(timestamp) as latest,
-        COUNT(DISTINCT hostname) as unique_hosts,
-        COUNT(DISTINCT asn) as unique_asns,
-        COUNT(*) as total_records
-    FROM dns_results
-    WHERE timestamp > ?;
-    """
-    debug_df = pd.read_sql_query(debug_query, conn, params=[cutoff_time])
-    print("\nData available in time period:")
-    print(debug_df)
+    # Debug query to show data range - a second scan, so only run it on request
+    if debug:
+        debug_query = """
+        SELECT 
+            MIN(timestamp) as earliest,
+            MAX(timestamp) as latest,
+            COUNT(DISTINCT hostname) as unique_hosts,
+            COUNT(DISTINCT asn) as unique_asns,
+            COUNT(*) as total_records
+        FROM dns_results
+        WHERE timestamp > ?;
+        """
+        debug_df = pd.read_sql_query(debug_query, conn, params=[cutoff_time])
+        print("\nData available in time period:")
+        print(debug_df)
     
     query = """
     WITH changes AS (
@@ -437,9 +468,13 @@ def get_asn_migrations(conn, hours_ago=24):
         FROM dns_results
         WHERE timestamp > ?
             AND asn IS NOT NULL
-        ORDER BY timestamp DESC
     )
-    SELECT *,
+    SELECT
+        hostname,
+        from_asn,
+        to_asn,
+        start_time,
+        end_time,
         julianday(end_time) - julianday(start_time) as duration_days
     FROM changes
     WHERE to_asn IS NOT NULL 
@@ -448,7 +483,9 @@ def get_asn_migrations(conn, hours_ago=24):
     LIMIT 50;
     """
     
-    df = pd.read_sql_query(query, conn, params=[cutoff_time])
+    df = pd.read_sql_query(query, conn, params=[cutoff_time], parse_dates=['start_time', 'end_time'])
+    for col in ('hostname', 'from_asn', 'to_asn'):
+        df[col] = df[col].astype('category')
     print(f"\nFound {len(df)} migrations in the specified time period")
     if not df.empty:
         print("\nSample of migrations found:")
@@ -464,12 +501,11 @@ def analyze_migrations(df):
     print("-" * 80)
     
     # Most common migration paths
-    migration_paths = df.groupby(['from_asn', 'to_asn']).size().reset_index(name='count')
-    migration_paths = migration_paths.sort_values('count', ascending=False)
+    migration_paths = df.groupby(['from_asn', 'to_asn'], observed=True).size().sort_values(ascending=False)
     
     print("\nMost Common Migration Paths:")
-    for _, path in migration_paths.iterrows():
-        print(f"AS{path['from_asn']} → AS{path['to_asn']}: {path['count']} migrations")
+    for (from_asn, to_asn), count in migration_paths.items():
+        print(f"AS{from_asn} → AS{to_asn}: {count} migrations")
     
     # Migration timing statistics
     df['duration_hours'] = df['duration_days'] * 24
@@ -480,37 +516,55 @@ def analyze_migrations(df):
     print(f"Maximum time between migrations: {df['duration_hours'].max():.2f} hours")
     
     # Most active hostnames
-    hostname_counts = df.groupby('hostname').size().sort_values(ascending=False)
+    hostname_counts = df.groupby('hostname', observed=True).size().sort_values(ascending=False)
     print("\nMost Active Hostnames (by number of migrations):")
     for hostname, count in hostname_counts.items():
         print(f"{hostname}: {count} migrations")
     
     # ASN Statistics
     print("\nASN Statistics:")
-    source_asns = df['from_asn'].value_counts()
-    dest_asns = df['to_asn'].value_counts()
-    all_asns = pd.concat([source_asns, dest_asns]).index.unique()
+    # Categorical counts include unused categories, so keep only ASNs that appear
+    source_asns = df['from_asn'].value_counts().loc[lambda counts: counts > 0]
+    dest_asns = df['to_asn'].value_counts().loc[lambda counts: counts > 0]
+    all_asns = source_asns.index.union(dest_asns.index)
+    
+    # Align both counts on the same ASN index so every stat comes from one pass
+    sources = source_asns.reindex(all_asns, fill_value=0)
+    destinations = dest_asns.reindex(all_asns, fill_value=0)
+    net_change = destinations.sub(sources)
     
-    for asn in all_asns:
-        sources = len(df[df['from_asn'] == asn])
-        destinations = len(df[df['to_asn'] == asn])
+    for asn, from_count, to_count, net in zip(all_asns, sources, destinations, net_change):
         print(f"AS{asn}:")
-        print(f"  Migrations from: {sources}")
-        print(f"  Migrations to: {destinations}")
-        print(f"  Net change: {destinations - sources}")
+        print(f"  Migrations from: {from_count}")
+        print(f"  Migrations to: {to_count}")
+        print(f"  Net change: {net}")
 
 def main():
-    print("\nDEBUG: Starting script execution")
+    parser = argparse.ArgumentParser(description='Analyze hostname ASN migrations from DNS results')
+    parser.add_argument('--debug', action='store_true', help='Print debug output and data range statistics')
+    # run_analysis.sh also passes --last12, which this script does not use
+    args, _ = parser.parse_known_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO,
+                        format='%(levelname)s: %(message)s')
+    
+    logging.debug("Starting script execution")
     try:
-        conn = sqlite3.connect('dns_results.db')
+        # Indexes come from create_indexes.py, which run_analysis.sh runs first; this only reads
+        conn = open_db()
+        
+        # Query the widest time window once and slice the narrower ones from it
+        time_windows = [48, 72]
+        all_migrations_df = get_asn_migrations(conn, max(time_windows), debug=args.debug)
         
         # Check different time windows
-        for hours in [48, 72]:
+        for hours in time_windows:
             print(f"\nAnalyzing migrations for the last {hours} hours:")
             print("=" * 50)
             
             # Get migrations for the specified time window
-            migrations_df = get_asn_migrations(conn, hours)
+            cutoff = pd.Timestamp.now(tz='UTC') - pd.Timedelta(hours=hours)
+            migrations_df = all_migrations_df[all_migrations_df['start_time'] > cutoff]
+            print(f"Found {len(migrations_df)} migrations in the last {hours} hours")
             
             if not migrations_df.empty:
                 # Create visualization
@@ -525,7 +579,7 @@ def main():
         
         conn.close()
         
-        print("\nDEBUG: Script completed successfully")
+        logging.debug("Script completed successfully")
     except Exception as e:
         print(f"ERROR in main: {str(e)}")
         raise
@@ -1,15 +1,55 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime, timedelta
+import numpy as np
+import hashlib
+import os
+
+from common import db_connection, savefig_ts, top_totals
+
+MAX_PLOT_POINTS = 400  # Longest time series to plot at full resolution
+CACHE_DIR = 'cache'  # Per-day query results reused between runs
+MAX_DATE_TICKS = 20  # Most date labels the heatmap's x axis can hold legibly
+
+def database_identity(conn):
+    """Text identifying the open database: its file, the file's inode, its schema and its oldest row."""
+    path = conn.execute('PRAGMA database_list').fetchone()[2]
+    inode = os.stat(path).st_ino if path else ''
+    schema = '\n'.join(row[0] for row in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' ORDER BY name"))
+    # A database rebuilt or copied over the same file still starts from a different row
+    oldest = conn.execute('SELECT MIN(timestamp) FROM dns_results').fetchone()[0]
+    return f"{path}\n{inode}\n{schema}\n{oldest}"
+
+def load_daily_rows(conn, query):
+    """Run a per-day query, reusing cached days and only querying from the newest cached day on."""
+    # Key the cache on the query text and the database, so an edited query or a replaced,
+    # rebuilt or different database starts from scratch instead of mixing in stale days
+    cache_key = hashlib.sha1(f"{query}\n{database_identity(conn)}".encode()).hexdigest()[:12]
+    cache_path = os.path.join(CACHE_DIR, f"cloudflare_daily_{cache_key}.pkl")
+    cached = None
+    since = ''
+    if os.path.exists(cache_path):
+        try:
+            cached = pd.read_pickle(cache_path)
+        except Exception as e:
+            print(f"Ignoring unreadable cache {cache_path}: {e}")
+    if cached is not None and not cached.empty:
+        # The newest cached day may have been partial when it was saved, so query it again
+        newest = cached['date'].max()
+        since = newest.strftime('%Y-%m-%d')
+        cached = cached[cached['date'] < newest]
+    
+    new_rows = pd.read_sql_query(query, conn, params=[since], parse_dates={'date': '%Y-%m-%d'})
+    df = pd.concat([cached, new_rows], ignore_index=True) if cached is not None else new_rows
+    
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_pickle(cache_path)
+    return df
 
 def analyze_cloudflare_usage():
-    # Connect to the database
-    conn = sqlite3.connect('dns_results.db')
-    
     # Query to get all records with Cloudflare ASN (AS13335) and join with status
     query = """
     WITH cloudflare_hosts AS (
@@ -18,8 +58,9 @@ def analyze_cloudflare_usage():
             ip_address,
             date(timestamp) as dns_date
         FROM dns_results
-        WHERE (asn LIKE '%13335%' OR as_name LIKE '%Cloudflare%')
-        AND success = 1
+        WHERE success = 1
+        AND (asn = 'AS13335 Cloudflare, Inc.' OR as_name LIKE '%Cloudflare%')
+        AND timestamp >= ?  -- RFC 3339 text sorts by time, so a day prefix bounds it
     )
     SELECT 
         ch.hostname,
@@ -34,15 +75,17 @@ def analyze_cloudflare_usage():
     ORDER BY ch.dns_date, count DESC
     """
     
-    # Read data into pandas DataFrame
-    df = pd.read_sql_query(query, conn)
+    with db_connection() as conn:
+        # Read data into pandas DataFrame, only querying days not already cached
+        df = load_daily_rows(conn, query)
+        
+        # Total successful DNS records, for the Cloudflare share reported below
+        total_query = "SELECT COUNT(*) as total FROM dns_results WHERE success = 1"
+        total_df = pd.read_sql_query(total_query, conn)
     
     if df.empty:
         print("No Cloudflare IP addresses found in the database.")
-        conn.close()
         return
-        
-    df['date'] = pd.to_datetime(df['date'])
     
     # Basic statistics
     print("\n=== Cloudflare Usage Analysis ===")
@@ -55,76 +98,91 @@ def analyze_cloudflare_usage():
     print(f"Unique hostnames: {unique_hosts}")
     
     # Get top hostnames using Cloudflare
-    top_hosts = df.groupby('hostname')['count'].sum().sort_values(ascending=False).head(10)
+    counts = df['count'].to_numpy()
+    host_totals = top_totals(df['hostname'], counts, 15)
+    top_hosts = host_totals.head(10)
     print("\nTop 10 Hostnames using Cloudflare:")
-    for host, count in top_hosts.items():
-        percentage = (count / total_records) * 100
-        print(f"{host}: {count} records ({percentage:.1f}%)")
+    host_percentages = top_hosts.to_numpy() / total_records * 100
+    print('\n'.join(f"{host}: {count} records ({percentage:.1f}%)"
+                    for host, count, percentage in zip(top_hosts.index, top_hosts.to_numpy(), host_percentages)))
     
     # Create time series plot
-    plt.figure(figsize=(12, 6))
+    fig, ax = plt.subplots(figsize=(12, 6))
     daily_counts = df.groupby('date')['count'].sum()
-    plt.plot(daily_counts.index, daily_counts.values, marker='o')
-    plt.title('Cloudflare IP Usage Over Time')
-    plt.xlabel('Date')
-    plt.ylabel('Number of DNS Records')
-    plt.grid(True)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    plt.savefig(f'cloudflare_usage_{timestamp}.png')
-    plt.close()
-    print(f"\nTime series plot saved as cloudflare_usage_{timestamp}.png")
+    # Switch to weekly totals once the daily series gets too long to read
+    if len(daily_counts) > MAX_PLOT_POINTS:
+        daily_counts = daily_counts.resample('W').sum()
+    ax.plot(daily_counts.index, daily_counts.values, marker='o')
+    ax.set_title('Cloudflare IP Usage Over Time')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Number of DNS Records')
+    ax.grid(True)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    filename = savefig_ts(fig, 'cloudflare_usage')
+    plt.close(fig)
+    print(f"\nTime series plot saved as {filename}")
     
     # Create hostname distribution heatmap
-    plt.figure(figsize=(15, 8))
-    pivot_data = df.pivot_table(
-        index='hostname',
-        columns='date',
-        values='count',
-        fill_value=0
-    )
+    fig, ax = plt.subplots(figsize=(15, 8))
     
     # Get top 15 hostnames by total count
-    top_15_hosts = df.groupby('hostname')['count'].sum().nlargest(15).index
-    pivot_data = pivot_data.loc[top_15_hosts]
-    
-    sns.heatmap(pivot_data, cmap='YlOrRd', cbar_kws={'label': 'Number of Records'})
-    plt.title('Cloudflare Usage Heatmap by Hostname')
-    plt.xlabel('Date')
-    plt.ylabel('Hostname')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(f'cloudflare_heatmap_{timestamp}.png')
-    plt.close()
-    print(f"Hostname heatmap saved as cloudflare_heatmap_{timestamp}.png")
+    top_15_hosts = host_totals.index
+    
+    # Accumulate a hostname x day grid directly instead of pivoting every hostname
+    hostname_codes = top_15_hosts.get_indexer(df['hostname'])
+    in_top = hostname_codes >= 0
+    first_date = df['date'].min()
+    date_codes = (df['date'] - first_date).dt.days.to_numpy()
+    n_days = date_codes.max() + 1
+    heatmap_grid = np.zeros((len(top_15_hosts), n_days), dtype=np.int64)
+    np.add.at(heatmap_grid, (hostname_codes[in_top], date_codes[in_top]), df['count'].to_numpy()[in_top])
+    heatmap_dates = pd.date_range(first_date, periods=n_days, freq='D')
+    
+    # One quad mesh over the grid, with cell edges at the half steps so ticks sit on cell centers
+    image = ax.pcolormesh(np.arange(n_days + 1) - 0.5, np.arange(len(top_15_hosts) + 1) - 0.5,
+                          heatmap_grid, cmap='YlOrRd')
+    ax.invert_yaxis()  # Busiest hostname on top
+    fig.colorbar(image, ax=ax, label='Number of Records')
+    ax.set_yticks(range(len(top_15_hosts)), top_15_hosts)
+    # Label every day on short ranges, thinning to about MAX_DATE_TICKS labels on long ones
+    tick_step = max(1, n_days // MAX_DATE_TICKS)
+    ax.set_xticks(range(0, n_days, tick_step), [d.strftime('%Y-%m-%d') for d in heatmap_dates[::tick_step]])
+    ax.set_title('Cloudflare Usage Heatmap by Hostname')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Hostname')
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    filename = savefig_ts(fig, 'cloudflare_heatmap')
+    plt.close(fig)
+    print(f"Hostname heatmap saved as {filename}")
     
     # Get IP address distribution
     print("\nIP Address Distribution:")
-    ip_distribution = df.groupby('ip_address')['count'].sum().sort_values(ascending=False).head(10)
-    for ip, count in ip_distribution.items():
-        percentage = (count / total_records) * 100
-        print(f"{ip}: {count} records ({percentage:.1f}%)")
+    ip_distribution = top_totals(df['ip_address'], counts, 10)
+    ip_percentages = ip_distribution.to_numpy() / total_records * 100
+    print('\n'.join(f"{ip}: {count} records ({percentage:.1f}%)"
+                    for ip, count, percentage in zip(ip_distribution.index, ip_distribution.to_numpy(), ip_percentages)))
     
     # Calculate percentage of total DNS records using Cloudflare
-    total_query = "SELECT COUNT(*) as total FROM dns_results WHERE success = 1"
-    total_df = pd.read_sql_query(total_query, conn)
     total_dns_records = total_df['total'].iloc[0]
     cloudflare_percentage = (total_records / total_dns_records) * 100
     print(f"\nPercentage of all successful DNS records using Cloudflare: {cloudflare_percentage:.1f}%")
     
     # Analyze status codes for Cloudflare hosts
-    status_distribution = df.groupby('status_code')['count'].sum()
+    # Status codes are small non-negative integers, so histogram them directly
+    status_totals = np.bincount(df['status_code'].to_numpy(), weights=counts).astype(np.int64)
+    status_codes = np.flatnonzero(status_totals)
+    status_distribution = pd.Series(status_totals[status_codes], index=status_codes)
     total_checked = status_distribution.sum()
     
     print("\nStatus Code Distribution for Cloudflare Hosts:")
-    for status_code, count in status_distribution.items():
-        percentage = (count / total_checked) * 100
-        status_desc = "Not checked" if status_code == 0 else f"HTTP {status_code}"
-        print(f"{status_desc}: {count} records ({percentage:.1f}%)")
+    status_percentages = status_distribution.to_numpy() / total_checked * 100
+    print('\n'.join(f"{'Not checked' if status_code == 0 else f'HTTP {status_code}'}: {count} records ({percentage:.1f}%)"
+                    for status_code, count, percentage in zip(status_distribution.index, status_distribution.to_numpy(), status_percentages)))
     
     # Create status code distribution plot
-    plt.figure(figsize=(12, 6))
+    fig, ax = plt.subplots(figsize=(12, 6))
     status_by_date = df.pivot_table(
         index='date',
         columns='status_code',
@@ -134,19 +192,17 @@ def analyze_cloudflare_usage():
     )
     
     # Plot stacked area chart
-    status_by_date.plot(kind='area', stacked=True)
-    plt.title('Status Code Distribution Over Time for Cloudflare Hosts')
-    plt.xlabel('Date')
-    plt.ylabel('Number of Records')
-    plt.legend(title='Status Code', 
+    status_by_date.plot(kind='area', stacked=True, ax=ax)
+    ax.set_title('Status Code Distribution Over Time for Cloudflare Hosts')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Number of Records')
+    ax.legend(title='Status Code', 
               labels=['Not checked' if code == 0 else f'HTTP {code}' for code in status_by_date.columns])
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig(f'cloudflare_status_{timestamp}.png')
-    plt.close()
-    print(f"\nStatus code distribution plot saved as cloudflare_status_{timestamp}.png")
-    
-    conn.close()
+    ax.grid(True)
+    fig.tight_layout()
+    filename = savefig_ts(fig, 'cloudflare_status')
+    plt.close(fig)
+    print(f"\nStatus code distribution plot saved as {filename}")
 
 if __name__ == "__main__":
     analyze_cloudflare_usage() 
\ No newline at end of file
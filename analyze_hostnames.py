@@ -1,17 +1,18 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import pandas as pd
 from collections import Counter
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
 from datetime import datetime
 import argparse
 import sys
+import numpy as np
+
+from common import db_connection
 
 def analyze_hostnames(pattern):
-    # Connect to the database
-    conn = sqlite3.connect('dns_results.db')
-    
     # Query to get ASN distribution over time
     time_query = """
     SELECT 
@@ -27,8 +28,8 @@ def analyze_hostnames(pattern):
     """
     
     # Read data into pandas DataFrame
-    time_df = pd.read_sql_query(time_query, conn, params=[f"{pattern}%"])
-    time_df['date'] = pd.to_datetime(time_df['date'])
+    with db_connection() as conn:
+        time_df = pd.read_sql_query(time_query, conn, params=[f"{pattern}%"], parse_dates={'date': '%Y-%m-%d'})
     
     # Print basic statistics
     print(f"\n=== ASN Distribution Over Time for '{pattern}%' ===")
@@ -36,7 +37,6 @@ def analyze_hostnames(pattern):
     
     if total_hostnames == 0:
         print("No data found for this pattern.")
-        conn.close()
         return
         
     print(f"Date range: {time_df['date'].min()} to {time_df['date'].max()}")
@@ -47,28 +47,26 @@ def analyze_hostnames(pattern):
     if not time_df.empty:
         top_asns = time_df.groupby(['asn', 'as_name'])['count'].sum().nlargest(5)
         print("\nTop 5 ASNs:")
-        for (asn, as_name), count in top_asns.items():
-            percentage = (count / total_hostnames) * 100
-            print(f"AS{asn} ({as_name}): {count} hostnames ({percentage:.1f}%)")
+        asn_percentages = top_asns.to_numpy() / total_hostnames * 100
+        print('\n'.join(f"AS{asn} ({as_name}): {count} hostnames ({percentage:.1f}%)"
+                        for (asn, as_name), count, percentage in zip(top_asns.index, top_asns.to_numpy(), asn_percentages)))
     
         # Create visualization
         plt.figure(figsize=(12, 6))
         
-        # Get top 5 ASNs
+        # Get top 5 ASNs, with one label per ASN built up front
         top_asns = time_df.groupby('asn')['count'].sum().nlargest(5).index
+        asn_labels = time_df.drop_duplicates('asn').set_index('asn')['as_name'].str[:20]
         
-        # Plot each top ASN's count over time
-        for asn in top_asns:
-            asn_data = time_df[time_df['asn'] == asn]
-            asn_name = asn_data['as_name'].iloc[0]
-            plt.plot(asn_data['date'], asn_data['count'], 
-                    label=f"AS{asn}\n{asn_name[:20]}",
-                    marker='o')
+        # Plot every top ASN's count over time from one date x ASN table
+        asn_counts = time_df.pivot_table(index='date', columns='asn', values='count', aggfunc='sum')[top_asns]
+        plt.plot(asn_counts.index, asn_counts.to_numpy(), marker='o')
         
         plt.title(f'Top 5 ASNs for {pattern}% over Time')
         plt.xlabel('Date')
         plt.ylabel('Number of Hostnames')
-        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+        plt.legend([f"AS{asn}\n{asn_labels[asn]}" for asn in top_asns],
+                   bbox_to_anchor=(1.05, 1), loc='upper left')
         plt.grid(True)
         plt.xticks(rotation=45)
         
@@ -81,25 +79,23 @@ def analyze_hostnames(pattern):
         if len(time_df['asn'].unique()) > 1:  # Only create heatmap if we have multiple ASNs
             plt.figure(figsize=(12, 6))
             
-            # Pivot the data for heatmap
-            heatmap_data = time_df.pivot_table(
-                index='date',
-                columns='asn',
-                values='count',
-                fill_value=0
-            )
-            
             # Get top 10 ASNs by total count
             top_asns = time_df.groupby('asn')['count'].sum().nlargest(10).index
-            heatmap_data = heatmap_data[top_asns]
             
-            plt.imshow(heatmap_data.T, aspect='auto', cmap='YlOrRd')
+            # Sum counts per top ASN and date straight into a dense grid
+            date_codes, dates = pd.factorize(time_df['date'], sort=True)
+            asn_codes = top_asns.get_indexer(time_df['asn'])
+            in_top = asn_codes >= 0
+            heatmap_grid = np.zeros((len(top_asns), len(dates)), dtype=np.int64)
+            np.add.at(heatmap_grid, (asn_codes[in_top], date_codes[in_top]), time_df['count'].to_numpy()[in_top])
+            
+            plt.imshow(heatmap_grid, aspect='auto', cmap='YlOrRd')
             plt.colorbar(label='Number of Hostnames')
             
             # Set labels
             plt.yticks(range(len(top_asns)), [f"AS{asn}" for asn in top_asns])
-            plt.xticks(range(len(heatmap_data.index)), 
-                      [d.strftime('%Y-%m-%d') for d in heatmap_data.index],
+            plt.xticks(range(len(dates)), 
+                      [d.strftime('%Y-%m-%d') for d in dates],
                       rotation=45)
             
             plt.title(f'ASN Activity Heatmap for {pattern}%')
@@ -110,8 +106,6 @@ def analyze_hostnames(pattern):
             plt.savefig(f'asn_heatmap_{pattern.replace(".", "_")}.png', bbox_inches='tight')
             plt.close()
             print(f"\nASN activity heatmap saved as asn_heatmap_{pattern.replace('.', '_')}.png")
-    
-    conn.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Analyze hostname patterns and their ASN distribution')
@@ -1,19 +1,24 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
 import networkx as nx
 from datetime import datetime, timedelta
 import numpy as np
 from collections import Counter
 
+from common import db_connection, top_totals
+
+MAX_GRAPH_NODES = 200  # Busiest nodes kept for the network layout
+
 def create_ip_visualizations(df):
     """Create various visualizations of IP address relationships"""
     try:
         # 1. IP Address Distribution
         plt.figure(figsize=(12, 6))
-        ip_counts = df['ip_address'].value_counts().head(10)
+        ip_counts = top_totals(df['ip_address'], n=10)
         plt.bar(range(len(ip_counts)), ip_counts.values)
         plt.xticks(range(len(ip_counts)), ip_counts.index, rotation=45)
         plt.title('Top 10 IP Addresses by Hostname Count')
@@ -26,20 +31,23 @@ def create_ip_visualizations(df):
 
         # 2. IP to Hostname Network Graph
         plt.figure(figsize=(15, 10))
-        G = nx.Graph()
         
-        # Add nodes and edges
-        for _, row in df.iterrows():
-            G.add_node(row['ip_address'], node_type='ip')
-            G.add_node(row['hostname'], node_type='hostname')
-            G.add_edge(row['ip_address'], row['hostname'])
+        # Add all edges in one pass, then tag each node with its type
+        G = nx.from_pandas_edgelist(df, source='ip_address', target='hostname')
+        nx.set_node_attributes(G, {ip: 'ip' for ip in df['ip_address'].unique()}, 'node_type')
+        nx.set_node_attributes(G, {hostname: 'hostname' for hostname in df['hostname'].unique()}, 'node_type')
         
         # Get the largest connected component
         largest_cc = max(nx.connected_components(G), key=len)
         G = G.subgraph(largest_cc)
         
+        # Keep only the best-connected nodes; layout cost grows with every node and edge
+        if G.number_of_nodes() > MAX_GRAPH_NODES:
+            degree = dict(G.degree())
+            G = G.subgraph(sorted(degree, key=degree.get, reverse=True)[:MAX_GRAPH_NODES])
+        
         # Position nodes using spring layout
-        pos = nx.spring_layout(G, k=1, iterations=50)
+        pos = nx.spring_layout(G, k=1, iterations=20, seed=0)
         
         # Draw the graph
         nx.draw_networkx_nodes(G, pos, 
@@ -64,24 +72,21 @@ def create_ip_visualizations(df):
 
         # 3. IP Address Heatmap by Hour
         plt.figure(figsize=(15, 8))
-        df['hour'] = df['timestamp'].dt.floor('h')
-        heatmap_data = df.pivot_table(
-            index='hour',
-            columns='ip_address',
-            values='hostname',
-            aggfunc='count',
-            fill_value=0
-        )
         
         # Get top 10 IPs by total count
-        top_ips = df['ip_address'].value_counts().head(10).index
-        heatmap_data = heatmap_data[top_ips]
+        top_ips = ip_counts.index
         
-        plt.imshow(heatmap_data.T, aspect='auto', cmap='YlOrRd', interpolation='nearest')
+        # Count rows per top IP and hour straight into a dense grid instead of pivoting every IP
+        hour_codes, hours = pd.factorize(df['hour'], sort=True)
+        ip_codes = top_ips.get_indexer(df['ip_address'])
+        in_top = ip_codes >= 0
+        heatmap_grid = np.zeros((len(top_ips), len(hours)), dtype=np.int64)
+        np.add.at(heatmap_grid, (ip_codes[in_top], hour_codes[in_top]), 1)
+        
+        plt.imshow(heatmap_grid, aspect='auto', cmap='YlOrRd', interpolation='nearest')
         plt.colorbar(label='Number of Hostnames')
         
         # Set labels
-        hours = heatmap_data.index
         plt.yticks(range(len(top_ips)), top_ips)
         plt.xticks(range(0, len(hours), max(1, len(hours)//6)), 
                   [h.strftime('%H:%M') for h in hours[::max(1, len(hours)//6)]],
@@ -103,11 +108,7 @@ def create_ip_visualizations(df):
         return False
 
 def analyze_ips():
-    conn = None
     try:
-        # Connect to the database
-        conn = sqlite3.connect('dns_results.db')
-        
         # Get data from the last 12 hours
         last_12_hours = (datetime.now() - timedelta(hours=12)).strftime('%Y-%m-%d %H:%M:%S')
         
@@ -115,6 +116,7 @@ def analyze_ips():
         query = """
         SELECT 
             datetime(timestamp) as timestamp,
+            strftime('%Y-%m-%d %H:00:00', timestamp) as hour,
             ip_address,
             hostname
         FROM dns_results
@@ -123,8 +125,9 @@ def analyze_ips():
         """
         
         # Read data into pandas DataFrame
-        df = pd.read_sql_query(query, conn, params=[last_12_hours])
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        with db_connection() as conn:
+            df = pd.read_sql_query(query, conn, params=[last_12_hours],
+                                   parse_dates={'timestamp': '%Y-%m-%d %H:%M:%S', 'hour': '%Y-%m-%d %H:%M:%S'})
         
         # Print basic statistics
         print("\n=== IP Address Analysis (Last 12 Hours) ===")
@@ -133,7 +136,7 @@ def analyze_ips():
         print(f"Total unique hostnames: {df['hostname'].nunique()}")
         
         # Get top 5 IPs by hostname count
-        top_ips = df['ip_address'].value_counts().head(5)
+        top_ips = top_totals(df['ip_address'], n=5)
         print("\nTop 5 IP Addresses by Hostname Count:")
         for ip, count in top_ips.items():
             print(f"{ip}: {count} hostnames")
@@ -145,9 +148,6 @@ def analyze_ips():
     except Exception as e:
         print(f"\nError during analysis: {str(e)}")
         return False
-    finally:
-        if conn:
-            conn.close()
     return True
 
 if __name__ == "__main__":
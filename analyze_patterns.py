@@ -1,22 +1,88 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
 import argparse
 import sys
 import numpy as np
+from pandas.api.types import union_categoricals
 
-def create_visualization(df, visualization_type, time_filter=None):
+from common import RUN_TIMESTAMP, db_connection, run_parallel
+
+SQL_CHUNK_SIZE = 100_000  # Rows per chunk when streaming query results
+
+# Per-second series get long; let Agg render them in chunks
+plt.rcParams['agg.path.chunksize'] = 10000
+
+MAX_PLOT_POINTS = 400  # Longest time series to plot at full resolution
+
+# Known hostname prefixes and the pattern each is reported as, checked in order
+KNOWN_PATTERNS = (
+    ('sunpass.com', 'sunpass.com'),
+    ('txtag.org', 'txtag.org'),
+    ('thetollroads.com', 'thetollroads.com'),
+    ('ezdrivema.com', 'ezdrivema.com'),
+    ('paytoll', 'paytoll*.vip'),
+)
+
+def classify_hostnames(hostnames):
+    """Map hostnames to their pattern: a known prefix, else up to three characters past the first dot."""
+    hostnames = pd.Series(hostnames, dtype=object)
+    lowered = hostnames.str.lower()
+    fallback = hostnames.str.extract(r'^([^.]*\..{0,3}|.{0,3})', expand=False)
+    return np.select([lowered.str.startswith(prefix, na=False) for prefix, _ in KNOWN_PATTERNS],
+                     [pattern for _, pattern in KNOWN_PATTERNS],
+                     default=fallback.to_numpy())
+
+def pattern_column(hostnames):
+    """Classify each distinct hostname once and spread the result over the rows."""
+    hostnames = hostnames.astype('category')
+    return pd.Categorical(classify_hostnames(hostnames.cat.categories)[hostnames.cat.codes])
+
+def fetch_hourly(conn, where_clause='', params=()):
+    """Load pattern counts already summed per hour, for the heatmap."""
+    query = f"""
+    SELECT 
+        strftime('%Y-%m-%d %H:00:00', timestamp) as hour,
+        hostname,
+        COUNT(*) as count
+    FROM dns_results
+    {where_clause}
+    GROUP BY hour, hostname
+    """
+    hourly = pd.read_sql_query(query, conn, params=params, parse_dates={'hour': '%Y-%m-%d %H:%M:%S'})
+    hourly['pattern'] = pattern_column(hourly.pop('hostname'))
+    return hourly.groupby(['hour', 'pattern'], observed=True)['count'].sum().reset_index()
+
+def downsample_counts(counts, max_points=MAX_PLOT_POINTS):
+    """Sum a time-indexed series or frame of counts into at most max_points time bins."""
+    if len(counts) <= max_points:
+        return counts
+    bin_width = ((counts.index.max() - counts.index.min()) / max_points).ceil('s')
+    binned = counts.resample(bin_width).sum()
+    # Drop the empty bins resample fills in so gaps in the data stay gaps
+    totals = binned.sum(axis=1) if binned.ndim == 2 else binned
+    return binned[totals > 0]
+
+def create_visualization(df, visualization_type, time_filter=None, top_patterns=None):
     """Helper function to create and save a visualization"""
     try:
+        # Top 10 patterns by total count, largest first; callers pass it in to skip the regroup
+        if top_patterns is None:
+            top_patterns = df.groupby('pattern', observed=True)['count'].sum().nlargest(10).index
+        
         if visualization_type == 'time_series':
-            plt.figure(figsize=(15, 8))
-            top_patterns = df.groupby('pattern')['count'].sum().nlargest(5).index
-            for pattern in top_patterns:
-                pattern_data = df[df['pattern'] == pattern]
-                plt.plot(pattern_data['date'], pattern_data['count'], 
+            fig = plt.figure(figsize=(15, 8), layout='constrained')
+            top_patterns = top_patterns[:5]
+            # Partition the top patterns' rows in one pass, keeping the top-5 order for the legend
+            top_rows = df[df['pattern'].isin(top_patterns)]
+            top_rows = top_rows.assign(pattern=top_rows['pattern'].astype(pd.CategoricalDtype(list(top_patterns))))
+            for pattern, pattern_rows in top_rows.groupby('pattern', observed=True):
+                pattern_data = downsample_counts(pattern_rows.set_index('date')['count'])
+                plt.plot(pattern_data.index, pattern_data.values, 
                         label=pattern, marker='o', linewidth=2)
             
             # Create title based on time range
@@ -37,12 +103,16 @@ def create_visualization(df, visualization_type, time_filter=None):
             plt.xticks(rotation=45)
             
         elif visualization_type == 'stacked_area':
-            plt.figure(figsize=(15, 8))
+            fig = plt.figure(figsize=(15, 8), layout='constrained')
             pivot_df = df.pivot(index='date', columns='pattern', values='count').fillna(0)
-            top_10_patterns = df.groupby('pattern')['count'].sum().nlargest(10).index
-            pivot_df = pivot_df[top_10_patterns]
-            pivot_df = pivot_df.div(pivot_df.sum(axis=1), axis=0) * 100
-            plt.stackplot(pivot_df.index, pivot_df.T, labels=pivot_df.columns)
+            pivot_df = downsample_counts(pivot_df[top_patterns])
+            # Normalize each row to percentages in place on one float32 array and plot it as is;
+            # bins where none of the top patterns appear stay at zero instead of NaN
+            shares = pivot_df.to_numpy(dtype=np.float32, copy=True)
+            row_totals = shares.sum(axis=1, keepdims=True)
+            np.divide(shares, row_totals, out=shares, where=row_totals != 0)
+            shares *= 100
+            plt.stackplot(pivot_df.index, shares.T, labels=pivot_df.columns)
             plt.title('Percentage Distribution of Top 10 Patterns Over Time')
             plt.xlabel('Date')
             plt.ylabel('Percentage of Total Hostnames')
@@ -52,22 +122,20 @@ def create_visualization(df, visualization_type, time_filter=None):
             
         elif visualization_type == 'heatmap':
             # Create a smaller figure for the heatmap
-            plt.figure(figsize=(12, 6))
-            
-            # Aggregate data by hour to reduce the number of time points
-            df['hour'] = df['date'].dt.floor('H')
-            heatmap_data = df.groupby(['hour', 'pattern'])['count'].sum().unstack(fill_value=0)
+            fig = plt.figure(figsize=(12, 6), layout='constrained')
             
-            # Get top 10 patterns instead of 15 to reduce complexity
-            top_patterns = df.groupby('pattern')['count'].sum().nlargest(10).index
-            heatmap_data = heatmap_data[top_patterns]
+            # Sum counts per top pattern and hour straight into a dense grid
+            hour_codes, hours = pd.factorize(df['hour'], sort=True)
+            pattern_codes = top_patterns.get_indexer(df['pattern'])
+            in_top = pattern_codes >= 0
+            heatmap_grid = np.zeros((len(top_patterns), len(hours)), dtype=np.int64)
+            np.add.at(heatmap_grid, (pattern_codes[in_top], hour_codes[in_top]), df['count'].to_numpy()[in_top])
             
             # Create the heatmap with a more efficient colormap
-            plt.imshow(heatmap_data.T, aspect='auto', cmap='YlOrRd', interpolation='nearest')
+            plt.imshow(heatmap_grid, aspect='auto', cmap='YlOrRd', interpolation='nearest')
             plt.colorbar(label='Number of Hostnames')
             
             # Set labels with reduced frequency
-            hours = heatmap_data.index
             plt.yticks(range(len(top_patterns)), top_patterns)
             plt.xticks(range(0, len(hours), max(1, len(hours)//6)), 
                       [h.strftime('%H:%M') for h in hours[::max(1, len(hours)//6)]],
@@ -77,16 +145,15 @@ def create_visualization(df, visualization_type, time_filter=None):
             plt.xlabel('Time (Hour)')
             plt.ylabel('Pattern')
         
-        plt.tight_layout()
-        time_str = datetime.now().strftime('%Y%m%d_%H%M%S')
         if time_filter:
-            filename = f'pattern_{visualization_type}_{time_filter}_{time_str}.png'
+            filename = f'pattern_{visualization_type}_{time_filter}_{RUN_TIMESTAMP}.png'
         else:
             filename = f'pattern_{visualization_type}.png'
         
-        # Save with lower DPI to reduce memory usage
-        plt.savefig(filename, bbox_inches='tight', dpi=100)
-        plt.close()
+        # Save with lower DPI to reduce memory usage; the constrained layout already fits the
+        # outside legends, so one draw is enough and no bbox_inches='tight' re-render is needed
+        fig.savefig(filename, dpi=100)
+        plt.close(fig)
         print(f"\n{visualization_type.replace('_', ' ').title()} plot saved as {filename}")
         return True
         
@@ -96,41 +163,47 @@ def create_visualization(df, visualization_type, time_filter=None):
         return False
 
 def analyze_patterns(today_only=False, last12=False):
-    conn = None
     try:
-        # Connect to the database
-        conn = sqlite3.connect('dns_results.db')
-        
-        # Base query
+        # Base query; hostnames are classified into patterns on the Python side
         base_query = """
         SELECT 
             datetime(timestamp) as date,
-            CASE 
-                WHEN hostname LIKE 'sunpass.com%' THEN 'sunpass.com'
-                WHEN hostname LIKE 'txtag.org%' THEN 'txtag.org'
-                WHEN hostname LIKE 'thetollroads.com%' THEN 'thetollroads.com'
-                WHEN hostname LIKE 'ezdrivema.com%' THEN 'ezdrivema.com'
-                WHEN hostname LIKE 'paytoll%' THEN 'paytoll*.vip'
-                ELSE substr(hostname, 1, instr(hostname, '.') + 3)
-            END as pattern,
+            hostname,
             COUNT(*) as count
         FROM dns_results
         """
         
-        # Add date filter if today_only or last12 is True
+        # Add date filter if today_only or last12 is True. The bounds compare against the raw
+        # RFC 3339 timestamp text so SQLite can range-scan the timestamp index
+        where_clause = ''
+        params = ()
         if today_only:
-            today = datetime.now().strftime('%Y-%m-%d')
-            base_query += f" WHERE date(timestamp) = '{today}'"
+            start = datetime.combine(date.today(), time.min)
+            where_clause = " WHERE timestamp >= ? AND timestamp < ?"
+            params = (start.isoformat(), (start + timedelta(days=1)).isoformat())
         elif last12:
-            last_12_hours = (datetime.now() - timedelta(hours=12)).strftime('%Y-%m-%d %H:%M:%S')
-            base_query += f" WHERE datetime(timestamp) >= '{last_12_hours}'"
+            last_12_hours = datetime.now() - timedelta(hours=12)
+            where_clause = " WHERE timestamp >= ?"
+            params = (last_12_hours.isoformat(timespec='seconds'),)
+        base_query += where_clause
         
         # Complete the query
-        base_query += " GROUP BY datetime(timestamp), pattern ORDER BY datetime(timestamp), count DESC"
+        base_query += " GROUP BY datetime(timestamp), hostname ORDER BY datetime(timestamp)"
         
-        # Read data into pandas DataFrame
-        df = pd.read_sql_query(base_query, conn)
-        df['date'] = pd.to_datetime(df['date'])
+        # Stream the grouped rows, shrinking each chunk before the next one is read
+        chunks = []
+        with db_connection() as conn:
+            for chunk in pd.read_sql_query(base_query, conn, params=params, chunksize=SQL_CHUNK_SIZE,
+                                           parse_dates={'date': '%Y-%m-%d %H:%M:%S'}):
+                chunk['pattern'] = pattern_column(chunk.pop('hostname'))
+                chunks.append(chunk.groupby(['date', 'pattern'], observed=True)['count'].sum().reset_index())
+            # The heatmap only needs hourly totals, so let SQLite sum those up front
+            hourly = fetch_hourly(conn, where_clause, params)
+        df = pd.concat([chunk.drop(columns='pattern') for chunk in chunks], ignore_index=True)
+        df['pattern'] = union_categoricals([chunk['pattern'] for chunk in chunks])
+        del chunks
+        # A second can straddle two chunks, so merge those rows back together
+        df = df.groupby(['date', 'pattern'], observed=True)['count'].sum().reset_index()
         
         # Print basic statistics
         print("\n=== Pattern Analysis Over Time ===")
@@ -142,30 +215,32 @@ def analyze_patterns(today_only=False, last12=False):
             print(f"Date range: {df['date'].min()} to {df['date'].max()}")
         print(f"Total unique patterns: {df['pattern'].nunique()}")
         
-        # Get top 5 patterns overall
-        top_patterns = df.groupby('pattern')['count'].sum().nlargest(5).index
+        # Total each pattern once; the summary and every figure slice the same top 10
+        pattern_totals = df.groupby('pattern', observed=True)['count'].sum().nlargest(10)
+        top_patterns = pattern_totals.index
         print("\nTop 5 Patterns Overall:")
-        for pattern in top_patterns:
-            total = df[df['pattern'] == pattern]['count'].sum()
+        for pattern, total in pattern_totals.head(5).items():
             print(f"{pattern}: {total} hostnames")
         
         # Create visualizations
         time_filter = 'today' if today_only else 'last12' if last12 else None
         
-        # Create visualizations one at a time with proper cleanup
-        if not create_visualization(df, 'time_series', time_filter):
+        # The figures are independent, so render them on separate worker processes
+        time_series_ok, stacked_area_ok, heatmap_ok = run_parallel([
+            (create_visualization, (df, 'time_series', time_filter, top_patterns)),
+            (create_visualization, (df, 'stacked_area', time_filter, top_patterns)),
+            (create_visualization, (hourly, 'heatmap', time_filter, top_patterns)),
+        ])
+        if not time_series_ok:
             print("Warning: Failed to create time series plot")
-        if not create_visualization(df, 'stacked_area', time_filter):
+        if not stacked_area_ok:
             print("Warning: Failed to create stacked area plot")
-        if not create_visualization(df, 'heatmap', time_filter):
+        if not heatmap_ok:
             print("Warning: Failed to create heatmap")
         
     except Exception as e:
         print(f"\nError during analysis: {str(e)}")
         return False
-    finally:
-        if conn:
-            conn.close()
     return True
 
 if __name__ == "__main__":
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime, timedelta
@@ -9,126 +10,167 @@ import argparse
 import os
 import numpy as np
 
+from common import db_connection, run_parallel, savefig_ts
+
+MAX_SUMMARY_HOSTNAMES = 50  # Hostnames listed per IP in the printed summary
+
+def join_hostnames(hostnames):
+    """Join the distinct hostnames, listing at most MAX_SUMMARY_HOSTNAMES of them."""
+    unique = hostnames.unique()
+    joined = ','.join(unique[:MAX_SUMMARY_HOSTNAMES])
+    if len(unique) > MAX_SUMMARY_HOSTNAMES:
+        joined += f",... (+{len(unique) - MAX_SUMMARY_HOSTNAMES} more)"
+    return joined
+
+def split_asn(asn):
+    """Split ASNs like 'AS13335 Cloudflare, Inc.' into the AS number and the first 40 characters of the rest."""
+    parts = asn.astype(object).str.split(n=1, expand=True).reindex(columns=[0, 1])
+    return parts[0], parts[1].fillna('').str.slice(0, 40)
+
 def get_data(hours=24):
     try:
-        conn = sqlite3.connect('dns_results.db')
         cutoff_time = datetime.now() - timedelta(hours=hours)
         
-        # Query for time series data
-        time_query = """
+        # One scan of the window: per-hour, per-hostname counts for each IP/ASN group, with
+        # the top 20 groups ranked by their window total and everything else dropped in SQL
+        query = """
+        WITH windowed AS (
+            SELECT 
+                strftime('%Y-%m-%d %H:00:00', timestamp) as hour,
+                ip_address,
+                asn,
+                as_name,
+                hostname,
+                COUNT(*) as count
+            FROM dns_results
+            WHERE timestamp > ?
+            GROUP BY hour, ip_address, asn, as_name, hostname
+        ),
+        top_ips AS (
+            SELECT 
+                ip_address,
+                asn,
+                as_name,
+                ROW_NUMBER() OVER (ORDER BY SUM(count) DESC) as rank
+            FROM windowed
+            GROUP BY ip_address, asn, as_name
+            ORDER BY rank
+            LIMIT 20
+        )
         SELECT 
-            strftime('%Y-%m-%d %H:00:00', timestamp) as hour,
-            ip_address,
-            asn,
-            COUNT(*) as count
-        FROM dns_results
-        WHERE timestamp > ?
-        GROUP BY hour, ip_address, asn
-        ORDER BY hour, count DESC
+            t.rank,
+            w.hour,
+            w.ip_address,
+            w.asn,
+            w.as_name,
+            w.hostname,
+            w.count
+        FROM windowed w
+        JOIN top_ips t ON w.ip_address IS t.ip_address AND w.asn IS t.asn AND w.as_name IS t.as_name
         """
         
-        # Query for summary data
-        summary_query = """
-        SELECT 
-            ip_address,
-            asn,
-            as_name,
-            COUNT(*) as count,
-            GROUP_CONCAT(DISTINCT hostname) as hostnames
-        FROM dns_results
-        WHERE timestamp > ?
-        GROUP BY ip_address, asn, as_name
-        ORDER BY count DESC
-        LIMIT 20
-        """
+        with db_connection() as conn:
+            df = pd.read_sql_query(query, conn, params=(cutoff_time.isoformat(),),
+                                   parse_dates={'hour': '%Y-%m-%d %H:%M:%S'})
+        
+        # Name missing ASN details up front; the figures and the printed summary both show them,
+        # then group on category codes instead of hashing every string again
+        df['asn'] = df['asn'].fillna('Unknown ASN')
+        df['as_name'] = df['as_name'].fillna('Unknown')
+        for column in ('ip_address', 'asn', 'as_name'):
+            df[column] = df[column].astype('category')
         
-        df_time = pd.read_sql_query(time_query, conn, params=(cutoff_time.isoformat(),))
-        df_summary = pd.read_sql_query(summary_query, conn, params=(cutoff_time.isoformat(),))
+        # Hourly series per IP, busiest IP first within each hour
+        df_time = (df.groupby(['hour', 'ip_address', 'asn'], dropna=False, observed=True)['count'].sum().reset_index()
+                   .sort_values(['hour', 'count'], ascending=[True, False], kind='stable', ignore_index=True))
+        
+        # Summary per IP/ASN group in rank order, with the distinct hostnames it served
+        df_summary = (df.groupby(['rank', 'ip_address', 'asn', 'as_name'], dropna=False, observed=True)
+                      .agg(count=('count', 'sum'), hostnames=('hostname', join_hostnames))
+                      .reset_index().drop(columns='rank'))
         
-        conn.close()
         return df_time, df_summary
     except Exception as e:
         print(f"Error getting data: {e}")
         return pd.DataFrame(), pd.DataFrame()
 
+def plot_time_series(df_time, hours):
+    """Plot hourly resolutions for each top IP address."""
+    fig = plt.figure(figsize=(15, 8), layout='constrained')
+    
+    # Plot each IP address as a line
+    for ip, ip_data in df_time.groupby('ip_address', sort=False, observed=True):
+        label = f"{ip}\n({ip_data['asn_num'].iloc[0]})"
+        plt.plot(ip_data['hour'], ip_data['count'], marker='o', label=label, linewidth=2)
+    
+    plt.title(f'IP Address Activity Over Time (Past {hours} Hours)')
+    plt.xlabel('Time')
+    plt.ylabel('Number of DNS Resolutions per Hour')
+    plt.xticks(rotation=45)
+    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    savefig_ts(fig, f'top_ips_time_series_{hours}h')
+    plt.close(fig)
+
+def plot_top_ips(df_summary, hours):
+    """Bar plot of the top IP addresses by count, colored by ASN."""
+    fig = plt.figure(figsize=(20, 10), layout='constrained')
+    
+    # Create color map for ASNs
+    unique_asns = df_summary.drop_duplicates('asn')
+    colors = plt.cm.tab20(np.linspace(0, 1, len(unique_asns)))
+    asn_color_map = dict(zip(unique_asns['asn'], colors))
+    
+    # Create bars with colors based on ASN
+    bars = plt.bar(range(len(df_summary)), df_summary['count'],
+                  color=[asn_color_map[asn] for asn in df_summary['asn']])
+    plt.xticks(range(len(df_summary)), df_summary['ip_address'], rotation=45, ha='right')
+    
+    # Create legend entries for ASNs
+    legend_elements = [plt.Rectangle((0,0),1,1, facecolor=color, label=f"{asn_num}: {asn_desc}...")
+                      for asn_num, asn_desc, color in zip(unique_asns['asn_num'], unique_asns['asn_desc'], colors)]
+    plt.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1), loc='upper left')
+    
+    plt.title(f'Top 20 IP Addresses (Past {hours} Hours)')
+    plt.xlabel('IP Address')
+    plt.ylabel('Number of DNS Resolutions')
+    savefig_ts(fig, f'top_ips_{hours}h')
+    plt.close(fig)
+
+def plot_asn_share(df_summary, hours):
+    """Pie chart of the top IP addresses grouped by ASN."""
+    fig = plt.figure(figsize=(20, 10), layout='constrained')
+    
+    asn_groups = df_summary.groupby(['asn', 'asn_num', 'as_name'], observed=True)['count'].sum().reset_index()
+    
+    # Create treemap data
+    sizes = asn_groups['count']
+    labels = [f'{asn_num}\n{name[:20]}...\n{count}' if len(str(name)) > 20 
+             else f'{asn_num}\n{name}\n{count}'
+             for asn_num, name, count in zip(asn_groups['asn_num'], asn_groups['as_name'], asn_groups['count'])]
+    
+    colors = plt.cm.viridis(np.linspace(0, 1, len(sizes)))
+    plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%')
+    plt.title(f'Distribution of Top IPs by ASN (Past {hours} Hours)')
+    plt.axis('equal')
+    savefig_ts(fig, f'top_ips_by_asn_{hours}h')
+    plt.close(fig)
+
 def create_visualizations(df_time, df_summary, hours=24):
     if len(df_time) == 0 or len(df_summary) == 0:
         print("No data available for visualization")
         return
-        
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    period = f"{hours}h"
     
     try:
-        # 1. Time series plot
-        plt.figure(figsize=(15, 8))
-        
-        # Convert hour to datetime
-        df_time['hour'] = pd.to_datetime(df_time['hour'])
-        
-        # Plot each IP address as a line
-        for ip in df_time['ip_address'].unique():
-            ip_data = df_time[df_time['ip_address'] == ip]
-            asn_value = ip_data['asn'].iloc[0]
-            asn = asn_value.split()[0] if asn_value else 'Unknown'  # Handle None values
-            label = f"{ip}\n({asn})"
-            plt.plot(ip_data['hour'], ip_data['count'], marker='o', label=label, linewidth=2)
-        
-        plt.title(f'IP Address Activity Over Time (Past {hours} Hours)')
-        plt.xlabel('Time')
-        plt.ylabel('Number of DNS Resolutions per Hour')
-        plt.xticks(rotation=45)
-        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-        plt.tight_layout()
-        plt.savefig(f'top_ips_time_series_{period}_{timestamp}.png', bbox_inches='tight')
-        plt.close()
-        
-        # 2. Bar plot of top IPs by count
-        plt.figure(figsize=(20, 10))
-        
-        # Create color map for ASNs, handling None values
-        df_summary['asn'] = df_summary['asn'].fillna('Unknown ASN')
-        unique_asns = df_summary['asn'].unique()
-        colors = plt.cm.tab20(np.linspace(0, 1, len(unique_asns)))
-        asn_color_map = dict(zip(unique_asns, colors))
-        
-        # Create bars with colors based on ASN
-        bars = plt.bar(range(len(df_summary)), df_summary['count'],
-                      color=[asn_color_map[asn] for asn in df_summary['asn']])
-        plt.xticks(range(len(df_summary)), df_summary['ip_address'], rotation=45, ha='right')
-        
-        # Create legend entries for ASNs
-        legend_elements = [plt.Rectangle((0,0),1,1, facecolor=color,
-                          label=f"{asn.split()[0] if isinstance(asn, str) else 'Unknown'}: {' '.join(asn.split()[1:])[:40] if isinstance(asn, str) else 'Unknown ASN'}...")
-                          for asn, color in asn_color_map.items()]
-        plt.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1), loc='upper left')
-        
-        plt.title(f'Top 20 IP Addresses (Past {hours} Hours)')
-        plt.xlabel('IP Address')
-        plt.ylabel('Number of DNS Resolutions')
-        plt.tight_layout()
-        plt.savefig(f'top_ips_{period}_{timestamp}.png', bbox_inches='tight')
-        plt.close()
-        
-        # 3. Treemap of IPs grouped by ASN
-        plt.figure(figsize=(20, 10))
-        
-        # Fill NA values in as_name
-        df_summary['as_name'] = df_summary['as_name'].fillna('Unknown')
-        asn_groups = df_summary.groupby(['asn', 'as_name'])['count'].sum().reset_index()
-        
-        # Create treemap data
-        sizes = asn_groups['count']
-        labels = [f'{asn.split()[0] if isinstance(asn, str) else "Unknown"}\n{name[:20]}...\n{count}' if len(str(name)) > 20 
-                 else f'{asn.split()[0] if isinstance(asn, str) else "Unknown"}\n{name}\n{count}'
-                 for asn, name, count in zip(asn_groups['asn'], asn_groups['as_name'], asn_groups['count'])]
-        
-        colors = plt.cm.viridis(np.linspace(0, 1, len(sizes)))
-        plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%')
-        plt.title(f'Distribution of Top IPs by ASN (Past {hours} Hours)')
-        plt.axis('equal')
-        plt.savefig(f'top_ips_by_asn_{period}_{timestamp}.png', bbox_inches='tight')
-        plt.close()
+        # Split the ASN labels once here rather than per legend entry and pie label
+        df_time['asn_num'], _ = split_asn(df_time['asn'])
+        df_summary['asn_num'], df_summary['asn_desc'] = split_asn(df_summary['asn'])
+        
+        # The three figures are independent, so render them on separate worker processes
+        run_parallel([
+            (plot_time_series, (df_time, hours)),
+            (plot_top_ips, (df_summary, hours)),
+            (plot_asn_share, (df_summary, hours)),
+        ])
     except Exception as e:
         print(f"Error creating visualizations: {e}")
 
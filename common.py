@@ -0,0 +1,92 @@
+import multiprocessing
+import sqlite3
+import sys
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import datetime
+
+DB_PATH = 'dns_results.db'
+
+# One timestamp per run so every file a script writes shares the same suffix
+RUN_TIMESTAMP = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+# Read-side tuning shared by the analysis scripts: memory-map the database file,
+# keep a 256 MB page cache and build sort/GROUP BY temp tables in memory
+READ_PRAGMAS = (
+    'PRAGMA mmap_size = 30000000000',
+    'PRAGMA cache_size = -262144',
+    'PRAGMA temp_store = MEMORY',
+)
+
+def open_db(path=DB_PATH):
+    """Open the results database with the read-side pragmas applied."""
+    conn = sqlite3.connect(path)
+    for pragma in READ_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def db_connection(path=DB_PATH):
+    """Open the results database for a with block; the connection is closed on exit."""
+    return closing(open_db(path))
+
+def savefig_ts(fig, prefix, **kwargs):
+    """Save fig as <prefix>_<RUN_TIMESTAMP>.png and return the file name."""
+    filename = f'{prefix}_{RUN_TIMESTAMP}.png'
+    fig.savefig(filename, **kwargs)
+    return filename
+
+def top_totals(keys, values=None, n=10):
+    """Sum values (or count rows) per key and return the n largest totals, largest first."""
+    codes, uniques = pd.factorize(keys)
+    valid = codes >= 0
+    weights = None if values is None else np.asarray(values)[valid]
+    totals = np.bincount(codes[valid], weights=weights, minlength=len(uniques)).astype(np.int64)
+    # Partition to find the n-th largest total, then stable-sort only the keys at or above it
+    # so ties keep first-seen order like value_counts()/nlargest()
+    if n < len(totals):
+        threshold = np.partition(totals, len(totals) - n)[len(totals) - n]
+        candidates = np.flatnonzero(totals >= threshold)
+    else:
+        candidates = np.arange(len(totals))
+    top = candidates[np.argsort(-totals[candidates], kind='stable')[:n]]
+    return pd.Series(totals[top], index=uniques[top])
+
+# Jobs handed to forked workers; set by the pool initializer so frames are never pickled
+_worker_jobs = ()
+
+def _init_worker(jobs):
+    global _worker_jobs
+    _worker_jobs = jobs
+
+def _run_job(index):
+    func, args = _worker_jobs[index]
+    return func(*args)
+
+def run_parallel(jobs):
+    """Run (func, args) jobs on forked worker processes and return their results in order."""
+    jobs = list(jobs)
+    # Without fork the frames would have to be pickled to every worker; just run in order
+    if len(jobs) < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [func(*args) for func, args in jobs]
+    sys.stdout.flush()  # Forked workers would otherwise print whatever is still buffered again
+    with ProcessPoolExecutor(max_workers=len(jobs), mp_context=multiprocessing.get_context('fork'),
+                             initializer=_init_worker, initargs=(jobs,)) as executor:
+        return list(executor.map(_run_job, range(len(jobs))))
+
+def decimate_minmax(x, y, max_points):
+    """Thin a series to at most max_points by keeping each bucket's minimum and maximum, in order."""
+    x, y = np.asarray(x), np.asarray(y)
+    if len(y) <= max_points:
+        return x, y
+    # Equal-width buckets of consecutive samples; pad the last one so argmin/argmax ignore the fill
+    size = -(-len(y) // (max_points // 2))
+    n_buckets = -(-len(y) // size)
+    pad = n_buckets * size - len(y)
+    values = y.astype(np.float64)
+    lows = np.argmin(np.pad(values, (0, pad), constant_values=np.inf).reshape(n_buckets, size), axis=1)
+    highs = np.argmax(np.pad(values, (0, pad), constant_values=-np.inf).reshape(n_buckets, size), axis=1)
+    starts = np.arange(n_buckets) * size
+    keep = np.unique(np.concatenate([starts + lows, starts + highs]))
+    return x[keep], y[keep]
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import sqlite3
+import os
+
+DB_PATH = 'dns_results.db'
+
+# Indexes shared by the analyze_*.py queries, keyed by the table they cover
+INDEXES = {
+    'dns_results': [
+        # Per-hostname ASN history in analyze_asn_migrations.py; also serves hostname lookups
+        'CREATE INDEX IF NOT EXISTS idx_dns_hostname_asn_ts ON dns_results(hostname, asn, timestamp)',
+        # Per-ASN scans in analyze_asn_migrations.py; also serves asn lookups
+        'CREATE INDEX IF NOT EXISTS idx_dns_asn_ts ON dns_results(asn, timestamp)',
+        # NOCASE so LIKE 'Cloudflare%' prefix matches in generate_cloudflare_csv.py can use it
+        'CREATE INDEX IF NOT EXISTS idx_dns_as_name ON dns_results(as_name COLLATE NOCASE)',
+        # The one timestamp-leading index: range scans on recent or per-day rows everywhere,
+        # covering the success filter too, as in generate_targets.py and analyze_cloudflare.py
+        'CREATE INDEX IF NOT EXISTS idx_dns_ts_success ON dns_results(timestamp, success)',
+    ],
+    'scammer_hosts': [
+        'CREATE INDEX IF NOT EXISTS idx_scammer_hosts_ts ON scammer_hosts(timestamp)',
+    ],
+    'status': [
+        'CREATE INDEX IF NOT EXISTS idx_status_host_ts ON status(hostname, date(timestamp))',
+        # Range scan on recent rows, as in visualize_last_hour.py
+        'CREATE INDEX IF NOT EXISTS idx_status_ts ON status(timestamp)',
+        # Covers the per-code timelines and first/last checks in the status_*.py/plot_time.py scripts
+        'CREATE INDEX IF NOT EXISTS idx_status_code_ts ON status(status_code, timestamp)',
+    ],
+}
+
+# Indexes an earlier version created that others now cover; every one costs the resolver a
+# write per inserted row, so they are dropped where they still exist
+RETIRED_INDEXES = {
+    'dns_results': ['idx_dns_asn', 'idx_dns_hostname', 'idx_dns_timestamp', 'idx_dns_timestamp_date',
+                    'idx_dns_success'],
+    'status': ['idx_status_code_host'],
+}
+
+def index_names(conn, table):
+    """Names of the indexes currently defined on table."""
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,))}
+
+def create_indexes(conn, tables=None):
+    """Create any missing analysis indexes, for every table or just the given ones, and refresh planner
+    statistics for the tables that got one."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, statements in INDEXES.items():
+        if tables is not None and table not in tables:
+            continue
+        # The status table only exists once the status checker has run
+        if table not in existing:
+            print(f"Skipping indexes for missing table {table}")
+            continue
+        before = index_names(conn, table)
+        for name in RETIRED_INDEXES.get(table, []):
+            if name in before:
+                conn.execute(f'DROP INDEX {name}')
+        for statement in statements:
+            conn.execute(statement)
+        # When everything was already in place there is nothing new for the planner, so skip the
+        # full-table ANALYZE scan and its write
+        if index_names(conn, table) - before:
+            conn.execute(f'ANALYZE {table}')
+    conn.commit()
+
+def main():
+    if not os.path.exists(DB_PATH):
+        print(f"Error: Database file {DB_PATH} not found")
+        return
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        create_indexes(conn)
+        print(f"Indexes are up to date in {DB_PATH}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
+import csv
 import sqlite3
-import pandas as pd
 from datetime import datetime
 import os
 
@@ -15,18 +15,19 @@ def generate_cloudflare_csv():
         # Connect to the database
         conn = sqlite3.connect('dns_results.db')
         
-        # Query to get Cloudflare-related DNS results
+        # Query to get Cloudflare-related DNS results; Cloudflare's AS names all start with
+        # "Cloudflare", so a prefix match can use the NOCASE as_name index
         query = """
         SELECT hostname, ip_address, asn, as_name, timestamp
         FROM dns_results
-        WHERE as_name LIKE '%Cloudflare%'
+        WHERE as_name LIKE 'Cloudflare%'
         ORDER BY timestamp DESC
         """
         
-        # Read data into pandas DataFrame
-        df = pd.read_sql_query(query, conn)
+        cursor = conn.execute(query)
+        first_row = cursor.fetchone()
         
-        if df.empty:
+        if first_row is None:
             print("No Cloudflare DNS results found in the database")
             return
             
@@ -34,9 +35,16 @@ def generate_cloudflare_csv():
         current_date = datetime.now().strftime('%Y%m%d')
         filename = f'cloudflare-{current_date}.csv'
         
-        # Save to CSV
-        df.to_csv(filename, index=False)
-        print(f"Successfully generated {filename} with {len(df)} records")
+        # Stream rows from the cursor straight to CSV instead of holding them all in memory
+        record_count = 1
+        with open(filename, 'w', newline='', buffering=1 << 20) as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow([column[0] for column in cursor.description])
+            writer.writerow(first_row)
+            for row in cursor:
+                writer.writerow(row)
+                record_count += 1
+        print(f"Successfully generated {filename} with {record_count} records")
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
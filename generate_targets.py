@@ -1,46 +1,73 @@
 #!/usr/bin/env python3
+import heapq
 import sqlite3
 from datetime import datetime, timedelta
 import re
-from collections import defaultdict
-import ipaddress
 import os
+import numpy as np
+import pandas as pd
+
+# Dotted-quad IPv4 address with octets 0-255 and no leading zeros
+IPV4_OCTET = r'(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)'
+IPV4_PATTERN = rf'{IPV4_OCTET}(?:\.{IPV4_OCTET}){{3}}'
+
+# Recent rows from each source table, newest first; scammer_hosts has no success column
+RECENT_HOSTS_QUERIES = (
+    """
+    SELECT timestamp, hostname, ip_address
+    FROM dns_results
+    WHERE timestamp >= datetime('now', '-1 day')
+    AND success = 1
+    ORDER BY timestamp DESC
+    """,
+    """
+    SELECT timestamp, hostname, ip_address
+    FROM scammer_hosts
+    WHERE timestamp >= datetime('now', '-1 day')
+    ORDER BY timestamp DESC
+    """,
+)
 
 def extract_domain_pattern(hostnames):
     """Extract common patterns from hostnames."""
-    patterns = defaultdict(int)
+    hostnames = pd.Series(hostnames, dtype=object)
     
-    for hostname in hostnames:
-        # Find basic pattern structure
-        parts = hostname.split('.')
-        if len(parts) >= 2:
-            tld = parts[-1]
-            domain = parts[-2]
-            prefix_pattern = '-'.join(parts[0].split('-')[:-1]) if '-' in parts[0] else parts[0]
-            suffix_pattern = parts[0].split('-')[-1] if '-' in parts[0] else ''
-            
-            if suffix_pattern and len(suffix_pattern) == 4:  # If it matches the 4-char pattern
-                pattern = f"{prefix_pattern}-XXXX.{domain}.{tld}"
-                patterns[pattern] += 1
-            else:
-                patterns[hostname] += 1
+    # Find basic pattern structure; hostnames without a dot are skipped
+    parts = hostnames.str.split('.')
+    hostnames = hostnames[parts.str.len() >= 2]
+    parts = parts[hostnames.index]
+    if hostnames.empty:
+        return {}
+
+    # Split the first label at its last '-' into prefix and suffix
+    first_label = parts.str[0].str.rpartition('-')
+    prefix_pattern, dash, suffix_pattern = first_label[0], first_label[1], first_label[2]
     
-    return patterns
+    # A 4-char suffix after the last '-' is the random part; collapse it to XXXX
+    is_pattern = (dash == '-') & (suffix_pattern.str.len() == 4)
+    pattern = prefix_pattern + '-XXXX.' + parts.str[-2] + '.' + parts.str[-1]
+    patterns = hostnames.where(~is_pattern, pattern)
+    
+    # Count in first-seen order, like the dict this used to build
+    return patterns.value_counts(sort=False).to_dict()
 
 def analyze_ip_ranges(ip_addresses):
     """Analyze IP addresses to find common ranges."""
-    networks = defaultdict(int)
+    ips = pd.Series(ip_addresses, dtype=object)
+    
+    # Only well-formed IPv4 addresses have a /16; anything else is skipped
+    ips = ips[ips.str.fullmatch(IPV4_PATTERN, na=False)]
+    if ips.empty:
+        return {}
     
-    for ip in ip_addresses:
-        try:
-            ip_obj = ipaddress.ip_address(ip)
-            # Get /16 network
-            network = str(ipaddress.ip_network(f"{ip_obj.exploded.rsplit('.', 2)[0]}.0.0/16", strict=False))
-            networks[network] += 1
-        except ValueError:
-            continue
+    # Pack the first two octets into a uint32 and keep just the /16 network bits
+    octets = ips.str.split('.', n=2, expand=True)
+    addresses = (octets[0].to_numpy(dtype=np.uint32) << 24) | (octets[1].to_numpy(dtype=np.uint32) << 16)
+    networks = pd.Series(addresses & np.uint32(0xFFFF0000)).value_counts(sort=False)
     
-    return networks
+    # Count in first-seen order, like the dict this used to build
+    return {f"{network >> 24}.{network >> 16 & 0xFF}.0.0/16": int(count)
+            for network, count in networks.items()}
 
 def main():
     # Get the current directory
@@ -49,25 +76,13 @@ def main():
     
     # Connect to the database
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
     
-    # Query recent results from both dns_results and scammer_hosts tables
-    cursor.execute("""
-        SELECT DISTINCT hostname, ip_address
-        FROM (
-            SELECT hostname, ip_address, timestamp
-            FROM dns_results
-            WHERE timestamp >= datetime('now', '-1 day')
-            AND success = 1
-            UNION ALL
-            SELECT hostname, ip_address, timestamp
-            FROM scammer_hosts
-            WHERE timestamp >= datetime('now', '-1 day')
-        )
-        ORDER BY timestamp DESC
-    """)
-    
-    results = cursor.fetchall()
+    # Query recent results from both dns_results and scammer_hosts tables. Each table is read
+    # newest first off its timestamp index; merging the two streams keeps that order without
+    # sorting the union, and dict.fromkeys drops repeated pairs keeping the newest
+    recent_rows = heapq.merge(*(conn.execute(query) for query in RECENT_HOSTS_QUERIES),
+                              key=lambda row: row[0], reverse=True)
+    results = list(dict.fromkeys((hostname, ip_address) for _, hostname, ip_address in recent_rows))
     hostnames = [row[0] for row in results]
     ip_addresses = [row[1] for row in results if row[1]]
     
@@ -75,19 +90,22 @@ def main():
     domain_patterns = extract_domain_pattern(hostnames)
     ip_ranges = analyze_ip_ranges(ip_addresses)
     
-    # Write results to targets.txt
-    with open('targets.txt', 'w') as f:
-        f.write("=== Domain Patterns ===\n")
-        for pattern, count in sorted(domain_patterns.items(), key=lambda x: x[1], reverse=True):
-            f.write(f"{pattern} (matches: {count})\n")
-        
-        f.write("\n=== IP Ranges (/16) ===\n")
-        for network, count in sorted(ip_ranges.items(), key=lambda x: x[1], reverse=True):
-            f.write(f"{network} (hosts: {count})\n")
-        
-        f.write("\n=== Individual Hosts ===\n")
-        for hostname in sorted(set(hostnames)):
-            f.write(f"{hostname}\n")
+    # Build the report as one list of lines
+    lines = ["=== Domain Patterns ===\n"]
+    lines.extend(f"{pattern} (matches: {count})\n"
+                 for pattern, count in sorted(domain_patterns.items(), key=lambda x: x[1], reverse=True))
+    
+    lines.append("\n=== IP Ranges (/16) ===\n")
+    lines.extend(f"{network} (hosts: {count})\n"
+                 for network, count in sorted(ip_ranges.items(), key=lambda x: x[1], reverse=True))
+    
+    lines.append("\n=== Individual Hosts ===\n")
+    lines.extend(f"{hostname}\n" for hostname in sorted(set(hostnames)))
+    
+    # Write results to targets.txt in one go, via a temp file so readers never see it half written
+    with open('targets.txt.tmp', 'w') as f:
+        f.write(''.join(lines))
+    os.replace('targets.txt.tmp', 'targets.txt')
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,43 +1,42 @@
 #!/usr/bin/env python3
 
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
-from datetime import datetime
 
-# Read the CSV file
-df = pd.read_csv('status_data.csv', names=['timestamp', 'status_code', 'count'], sep='|')
-df['timestamp'] = pd.to_datetime(df['timestamp'])
+from status_viz import TIMELINE_RC, plot_timeline, print_timeline_stats
 
-# Create the plot
-plt.figure(figsize=(15, 8))
+# Arrow's multithreaded CSV reader when it is installed, else pandas' C parser
+try:
+    import pyarrow
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
 
-# Plot each status code as a separate line
-for status in sorted(df['status_code'].unique()):
-    status_data = df[df['status_code'] == status]
-    plt.plot(status_data['timestamp'], status_data['count'], 
-            label=f'Status {status}',
-            marker='o' if len(status_data) < 50 else None,
-            linewidth=2 if status == 200 else 1)
+# Read the CSV file, parsing the fixed-format timestamps and narrow ints as it goes
+df = pd.read_csv('status_data.csv', names=['time', 'status_code', 'count'], sep='|', engine=CSV_ENGINE,
+                 dtype={'status_code': 'int16', 'count': 'int32'},
+                 parse_dates=['time'], date_format='%Y-%m-%d %H:%M:%S')
 
-plt.title('HTTP Status Codes Over Time')
-plt.xlabel('Time')
-plt.ylabel('Number of Checks')
-plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-plt.grid(True, alpha=0.3)
+with plt.rc_context(TIMELINE_RC):
+    # Create the plot
+    plt.figure(figsize=(15, 8))
 
-# Rotate x-axis labels for better readability
-plt.xticks(rotation=45)
+    # Plot each status code as a separate line, with the 200 line thicker
+    plot_timeline(df, highlight_ok=True)
+    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    plt.grid(True, alpha=0.3)
 
-# Adjust layout to prevent label cutoff
-plt.tight_layout()
+    # Rotate x-axis labels for better readability
+    plt.xticks(rotation=45)
 
-# Save the plot
-plt.savefig('status_timeline.png', bbox_inches='tight', dpi=300)
+    # Adjust layout to prevent label cutoff
+    plt.tight_layout()
+
+    # Save the plot
+    plt.savefig('status_timeline.png', bbox_inches='tight', dpi=300)
 print("\nTimeline visualization saved as status_timeline.png")
 
 # Print some statistics
-print("\nTime range of data:")
-print(f"Start: {df['timestamp'].min()}")
-print(f"End: {df['timestamp'].max()}")
-print(f"\nTotal unique timestamps: {df['timestamp'].nunique()}")
-print(f"Total status codes tracked: {df['status_code'].nunique()}") 
\ No newline at end of file
+print_timeline_stats(df)
@@ -1,49 +1,27 @@
 #!/usr/bin/env python3
 
-import sqlite3
-import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
-from datetime import datetime
 import os
 
+from status_viz import load_status_df, plot_timeline, print_timeline_stats
+
 def plot_status():
     if not os.path.exists('dns_results.db'):
         print("\nError: dns_results.db not found!")
         print("Please run the DNS resolver first to collect data.")
         return
         
-    conn = sqlite3.connect('dns_results.db')
-    
     try:
-        # Query to get status codes over time
-        query = """
-        SELECT 
-            status_code,
-            datetime(timestamp) as timestamp,
-            COUNT(*) as count
-        FROM status
-        GROUP BY status_code, datetime(timestamp)
-        ORDER BY datetime(timestamp)
-        """
-        
-        # Read data into pandas DataFrame
-        df = pd.read_sql_query(query, conn)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        # Status codes over time
+        df = load_status_df()
         
         # Create the plot
         plt.figure(figsize=(15, 8))
         
-        # Plot each status code as a separate line
-        for status in sorted(df['status_code'].unique()):
-            status_data = df[df['status_code'] == status]
-            plt.plot(status_data['timestamp'], status_data['count'], 
-                    label=f'Status {status}',
-                    marker='o' if len(status_data) < 50 else None,  # Only show markers if few points
-                    linewidth=2 if status == 200 else 1)  # Make 200 line thicker
-        
-        plt.title('HTTP Status Codes Over Time')
-        plt.xlabel('Time')
-        plt.ylabel('Number of Checks')
+        # Plot each status code as a separate line, with the 200 line thicker
+        plot_timeline(df, highlight_ok=True)
         plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
         plt.grid(True, alpha=0.3)
         
@@ -58,16 +36,10 @@ def plot_status():
         print("\nTimeline visualization saved as status_timeline.png")
         
         # Print some statistics
-        print("\nTime range of data:")
-        print(f"Start: {df['timestamp'].min()}")
-        print(f"End: {df['timestamp'].max()}")
-        print(f"\nTotal unique timestamps: {df['timestamp'].nunique()}")
-        print(f"Total status codes tracked: {df['status_code'].nunique()}")
+        print_timeline_stats(df)
         
     except Exception as e:
         print(f"\nError while creating visualization: {str(e)}")
-    finally:
-        conn.close()
 
 if __name__ == "__main__":
-    plot_status() 
\ No newline at end of file
+    plot_status()
@@ -1,69 +1,34 @@
 #!/usr/bin/env python3
 
-import sqlite3
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
 from datetime import datetime
 import os
 
-def plot_time_series():
-    # Connect to database
-    conn = sqlite3.connect('dns_results.db')
-    cursor = conn.cursor()
+from status_viz import load_status_df, plot_timeline
 
+def plot_time_series():
     try:
-        # Get data
-        cursor.execute("""
-            SELECT datetime(timestamp) as time, status_code, COUNT(*) as count 
-            FROM status 
-            WHERE timestamp IS NOT NULL
-            GROUP BY datetime(timestamp), status_code 
-            ORDER BY datetime(timestamp)
-        """)
-        data = cursor.fetchall()
+        # Get data; rows SQLite cannot date are already left out
+        df = load_status_df()
 
-        if not data:
+        if df.empty:
             print("No data found in the status table")
             return
 
-        # Organize data by status code
-        status_codes = {}
-        for time_str, code, count in data:
-            if time_str and code is not None:  # Skip NULL values
-                if code not in status_codes:
-                    status_codes[code] = {'times': [], 'counts': []}
-                try:
-                    time = datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
-                    status_codes[code]['times'].append(time)
-                    status_codes[code]['counts'].append(count)
-                except ValueError:
-                    print(f"Warning: Could not parse timestamp: {time_str}")
-
-        if not status_codes:
-            print("No valid data found after filtering")
-            return
-
         # Create plot
         plt.figure(figsize=(15, 8))
 
         # Plot each status code
-        for code in sorted(status_codes.keys()):
-            if status_codes[code]['times']:  # Only plot if we have data
-                plt.plot(status_codes[code]['times'], 
-                        status_codes[code]['counts'],
-                        label=f'Status {code}',
-                        marker='o' if len(status_codes[code]['times']) < 50 else None)
-
-        plt.title('HTTP Status Codes Over Time')
-        plt.xlabel('Time')
-        plt.ylabel('Number of Checks')
+        plot_timeline(df)
         plt.legend()
         plt.grid(True)
         plt.xticks(rotation=45)
         plt.tight_layout()
 
         # Create visualizations directory if it doesn't exist
-        if not os.path.exists('visualizations'):
-            os.makedirs('visualizations')
+        os.makedirs('visualizations', exist_ok=True)
 
         # Generate filename with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -75,14 +40,11 @@ def plot_time_series():
 
         # Print statistics
         print("\nStatus code statistics:")
-        for code in sorted(status_codes.keys()):
-            total = sum(status_codes[code]['counts'])
+        for code, total in df.groupby('status_code', sort=True)['count'].sum().items():
             print(f"Status {code}: {total} checks")
 
     except Exception as e:
         print(f"Error: {str(e)}")
-    finally:
-        conn.close()
 
 if __name__ == "__main__":
     plot_time_series() 
\ No newline at end of file
@@ -13,6 +13,9 @@ cd /home/oliverday/rust-dns-resolver
 # Log start of execution
 echo "Starting analysis run at $(date)"
 
+# Make sure the query indexes exist before the analysis scripts run
+python3 create_indexes.py 2>&1
+
 # Run the analysis scripts and log any errors
 python3 analyze_patterns.py --last12 2>&1
 python3 analyze_top_ips.py 2>&1
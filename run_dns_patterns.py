@@ -4,41 +4,57 @@ import os
 import re
 from typing import List, Set
 
+# Resolver patterns for the hostname families we expand; the txtag.org ones double as the
+# regexes that detect them, compiled once here rather than looked up per line
+SUNPASS_PATTERN = r'sunpass\.com-[a-z]{4}\.win'
+TXTAG_3_PATTERN = r'txtag\.org-[a-z]{3}\.win'
+TXTAG_4_PATTERN = r'txtag\.org-[a-z]{4}\.win'
+TXTAG_3_RE = re.compile(TXTAG_3_PATTERN)
+TXTAG_4_RE = re.compile(TXTAG_4_PATTERN)
+ALL_PATTERNS = {SUNPASS_PATTERN, TXTAG_3_PATTERN, TXTAG_4_PATTERN}
+
+# Release build of the resolver, next to this script
+RESOLVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'rust-dns-resolver', 'target', 'release', 'rust-dns-resolver')
+
+# Resolver runs at once in run_resolvers.sh; they share the database and the ip-api.com rate limit
+RESOLVER_JOBS = 2
+
 def extract_base_patterns(targets_file: str) -> Set[str]:
     """Extract unique base patterns from targets.txt and convert them to regex patterns."""
     patterns = set()
     
+    # Stream the file line by line instead of reading it into a list first
     with open(targets_file, 'r') as f:
-        lines = f.readlines()
-    
-    # Process each line
-    for line in lines:
-        line = line.strip()
-        
-        # Skip empty lines and section headers
-        if not line or line.startswith('==='):
-            continue
+        for line in f:
+            line = line.strip()
+            
+            # Skip empty lines and section headers
+            if not line or line.startswith('==='):
+                continue
+                
+            # Extract the domain pattern
+            if 'sunpass.com-' in line:
+                patterns.add(SUNPASS_PATTERN)
+            elif 'txtag.org-' in line:
+                # Handle both 3 and 4 character patterns for txtag.org
+                if TXTAG_3_RE.search(line):
+                    patterns.add(TXTAG_3_PATTERN)
+                elif TXTAG_4_RE.search(line):
+                    patterns.add(TXTAG_4_PATTERN)
             
-        # Extract the domain pattern
-        if 'sunpass.com-' in line:
-            patterns.add('sunpass\.com-[a-z]{4}\.win')
-        elif 'txtag.org-' in line:
-            # Handle both 3 and 4 character patterns for txtag.org
-            if re.search(r'txtag\.org-[a-z]{3}\.win', line):
-                patterns.add('txtag\.org-[a-z]{3}\.win')
-            elif re.search(r'txtag\.org-[a-z]{4}\.win', line):
-                patterns.add('txtag\.org-[a-z]{4}\.win')
+            # Nothing left to find once every pattern has turned up
+            if patterns == ALL_PATTERNS:
+                break
     
     return patterns
 
 def generate_resolver_commands(patterns: Set[str]) -> List[str]:
     """Generate DNS resolver commands for each pattern."""
     commands = []
-    resolver_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
-                                'rust-dns-resolver', 'target', 'release', 'rust-dns-resolver')
     
     for pattern in patterns:
-        cmd = f"{resolver_path} --pattern '{pattern}'"
+        cmd = f"{RESOLVER_PATH} --pattern '{pattern}'"
         commands.append(cmd)
     
     return commands
@@ -53,16 +69,20 @@ def main():
     # Write commands to a shell script
     with open('run_resolvers.sh', 'w') as f:
         f.write('#!/bin/bash\n\n')
-        f.write('# DNS resolver commands for detected patterns\n\n')
+        f.write('# DNS resolver commands for detected patterns, one per line. Every run writes to the\n')
+        f.write('# same dns_results.db and looks its IPs up on the rate-limited ip-api.com endpoint, so\n')
+        f.write('# more parallel runs mean lock timeouts (dropped rows) and NULL ASNs; keep RESOLVER_JOBS small\n\n')
+        f.write('RESOLVER_JOBS="${RESOLVER_JOBS:-%d}"\n\n' % RESOLVER_JOBS)
         
+        # Add error handling and logging; xargs -d keeps each command's quoting intact
+        f.write('xargs -d \'\\n\' -P "$RESOLVER_JOBS" -I{} '
+                'bash -c \'echo "Running: $1"; eval "$1" || echo "Failed: $1"\' _ {} <<\'EOF\'\n')
         for cmd in commands:
-            # Add error handling and logging
-            f.write(f'echo "Running: {cmd}"\n')
-            f.write(f'{cmd} || echo "Failed: {cmd}"\n')
-            f.write('echo "----------------------------------------"\n\n')
-    
-    # Make the shell script executable
-    os.chmod('run_resolvers.sh', 0o755)
+            f.write(f'{cmd}\n')
+        f.write('EOF\n')
+        
+        # Make the shell script executable through the open descriptor
+        os.fchmod(f.fileno(), 0o755)
     
     print("Generated run_resolvers.sh with the following patterns:")
     for pattern in patterns:
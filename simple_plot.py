@@ -1,71 +1,42 @@
 #!/usr/bin/env python3
 
 import sqlite3
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
 from datetime import datetime
-import pandas as pd
 import sys
 
+from status_viz import TIMELINE_RC, load_status_df, plot_timeline
+
 def create_plot():
     try:
-        # Connect to database
-        conn = sqlite3.connect('dns_results.db')
-        
-        # Get data using pandas (handles datetime conversion automatically)
-        query = """
-            SELECT 
-                datetime(timestamp) as time,
-                status_code,
-                COUNT(*) as count 
-            FROM status 
-            WHERE status_code IS NOT NULL
-            GROUP BY datetime(timestamp), status_code 
-            ORDER BY datetime(timestamp)
-        """
-        df = pd.read_sql_query(query, conn, parse_dates=['time'])
+        # Get data (timestamps come back parsed)
+        df = load_status_df()
         
         if len(df) == 0:
             print("No data found in the status table")
             return False
             
-        # Create plot
-        plt.figure(figsize=(15, 8))
-        
-        # Plot each status code
-        for code in sorted(df['status_code'].unique()):
-            code_data = df[df['status_code'] == code]
-            label = f'Status {code}'
-            if code >= 200 and code < 300:
-                label += ' (Success)'
-            elif code >= 300 and code < 400:
-                label += ' (Redirect)'
-            elif code >= 400 and code < 500:
-                label += ' (Client Error)'
-            elif code >= 500:
-                label += ' (Server Error)'
-                
-            plt.plot(code_data['time'], 
-                    code_data['count'],
-                    label=label,
-                    marker='o' if len(code_data) < 50 else None,
-                    linestyle='-' if code < 400 else '--')  # Dashed lines for error codes
+        with plt.rc_context(TIMELINE_RC):
+            # Create plot
+            plt.figure(figsize=(15, 8))
         
-        plt.title('HTTP Status Codes Over Time')
-        plt.xlabel('Time')
-        plt.ylabel('Number of Checks')
-        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-        plt.grid(True, alpha=0.3)
+            # Plot each status code, labelled with its class and dashed for error codes
+            plot_timeline(df, describe_codes=True)
+            plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+            plt.grid(True, alpha=0.3)
         
-        # Rotate and align the tick labels so they look better
-        plt.gcf().autofmt_xdate()
+            # Rotate and align the tick labels so they look better
+            plt.gcf().autofmt_xdate()
         
-        # Use tight_layout with a larger right margin for the legend
-        plt.tight_layout(rect=[0, 0, 0.85, 1])
+            # Use tight_layout with a larger right margin for the legend
+            plt.tight_layout(rect=[0, 0, 0.85, 1])
         
-        # Save plot
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'status_timeline_{timestamp}.png'
-        plt.savefig(filename, dpi=300, bbox_inches='tight')
+            # Save plot
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filename = f'status_timeline_{timestamp}.png'
+            plt.savefig(filename, dpi=300, bbox_inches='tight')
         print(f"Plot saved as {filename}")
         
         # Print summary statistics
@@ -85,8 +56,6 @@ def create_plot():
         return False
     finally:
         plt.close()
-        if 'conn' in locals():
-            conn.close()
 
 if __name__ == "__main__":
     success = create_plot()
@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import os
 from datetime import datetime, timedelta
 import pandas as pd
 import sys
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 from pathlib import Path
 
+from common import open_db
+
+# Fastest zlib level for the PNGs; the files get a little bigger but encode much quicker
+PNG_KWARGS = {'compress_level': 1}
+
+MAX_ANNOTATED_CELLS = 24 * 12  # Largest heatmap that still gets per-cell counts
+
 def get_status_description(code):
     """Return a description for HTTP status codes."""
     descriptions = {
@@ -30,54 +38,52 @@ def get_status_description(code):
     }
     return descriptions.get(code, "Unknown Status Code")
 
-def create_visualizations(df, output_dir, timestamp):
+def create_visualizations(status_summary, timeline, hourly, output_dir, timestamp):
     """Create and save visualizations of the status code data."""
-    # Set the style
-    plt.style.use('seaborn-v0_8-darkgrid')
-    
-    # 1. Pie chart of status code distribution
-    plt.figure(figsize=(10, 8))
-    status_counts = df['status_code'].value_counts()
-    plt.pie(status_counts.values, labels=status_counts.index, autopct='%1.1f%%')
-    plt.title('Distribution of HTTP Status Codes')
-    plt.savefig(os.path.join(output_dir, f'status_distribution_pie_{timestamp}.png'))
-    plt.close()
+    # Apply the style for these figures only, instead of changing the global state
+    with plt.style.context('seaborn-v0_8-darkgrid'):
+        # 1. Pie chart of status code distribution
+        plt.figure(figsize=(10, 8))
+        plt.pie(status_summary['count'], labels=status_summary['status_code'], autopct='%1.1f%%')
+        plt.title('Distribution of HTTP Status Codes')
+        plt.savefig(os.path.join(output_dir, f'status_distribution_pie_{timestamp}.png'), pil_kwargs=PNG_KWARGS)
+        plt.close()
 
-    # 2. Time series plot
-    plt.figure(figsize=(15, 8))
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    status_over_time = df.groupby(['timestamp', 'status_code']).size().unstack(fill_value=0)
-    status_over_time.plot(kind='line', marker='.')
-    plt.title('Status Codes Over Time')
-    plt.xlabel('Time')
-    plt.ylabel('Count')
-    plt.legend(title='Status Code', bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, f'status_timeseries_{timestamp}.png'))
-    plt.close()
+        # 2. Time series plot
+        plt.figure(figsize=(15, 8))
+        # Reshape the SQL counts straight into a zero-filled integer grid; no float copy
+        status_over_time = timeline.set_index(['bucket', 'status_code'])['count'].unstack(fill_value=0)
+        status_over_time.plot(kind='line', marker='.', ax=plt.gca())
+        plt.title('Status Codes Over Time')
+        plt.xlabel('Time')
+        plt.ylabel('Count')
+        plt.legend(title='Status Code', bbox_to_anchor=(1.05, 1), loc='upper left')
+        plt.tight_layout()
+        plt.savefig(os.path.join(output_dir, f'status_timeseries_{timestamp}.png'), pil_kwargs=PNG_KWARGS)
+        plt.close()
 
-    # 3. Heatmap of status codes by hour
-    plt.figure(figsize=(12, 8))
-    df['hour'] = df['timestamp'].dt.hour
-    hourly_status = pd.crosstab(df['hour'], df['status_code'])
-    sns.heatmap(hourly_status, cmap='YlOrRd', annot=True, fmt='d')
-    plt.title('Status Codes by Hour of Day')
-    plt.xlabel('Status Code')
-    plt.ylabel('Hour of Day')
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, f'status_heatmap_{timestamp}.png'))
-    plt.close()
+        # 3. Heatmap of status codes by hour
+        plt.figure(figsize=(12, 8))
+        hourly_status = hourly.set_index(['hour', 'status_code'])['count'].unstack(fill_value=0)
+        # One text artist per cell gets slow and unreadable once many codes show up
+        sns.heatmap(hourly_status, cmap='YlOrRd', annot=hourly_status.size <= MAX_ANNOTATED_CELLS, fmt='d')
+        plt.title('Status Codes by Hour of Day')
+        plt.xlabel('Status Code')
+        plt.ylabel('Hour of Day')
+        plt.tight_layout()
+        plt.savefig(os.path.join(output_dir, f'status_heatmap_{timestamp}.png'), pil_kwargs=PNG_KWARGS)
+        plt.close()
 
-    # 4. Bar plot of unique hosts per status code
-    plt.figure(figsize=(12, 6))
-    hosts_per_status = df.groupby('status_code')['hostname'].nunique()
-    hosts_per_status.plot(kind='bar')
-    plt.title('Unique Hosts per Status Code')
-    plt.xlabel('Status Code')
-    plt.ylabel('Number of Unique Hosts')
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, f'hosts_per_status_{timestamp}.png'))
-    plt.close()
+        # 4. Bar plot of unique hosts per status code
+        plt.figure(figsize=(12, 6))
+        hosts_per_status = status_summary.set_index('status_code')['hosts'].sort_index()
+        hosts_per_status.plot(kind='bar')
+        plt.title('Unique Hosts per Status Code')
+        plt.xlabel('Status Code')
+        plt.ylabel('Number of Unique Hosts')
+        plt.tight_layout()
+        plt.savefig(os.path.join(output_dir, f'hosts_per_status_{timestamp}.png'), pil_kwargs=PNG_KWARGS)
+        plt.close()
 
 def count_status():
     """Count and analyze HTTP status codes from the database."""
@@ -89,16 +95,69 @@ def count_status():
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     output_file = output_dir / f'status_report_{timestamp}.txt'
     
-    conn = sqlite3.connect('dns_results.db')
+    # Indexes come from create_indexes.py; this report only reads
+    conn = open_db()
+    
+    # Let SQLite do the counting; only aggregates and a few sample rows come back
+    summary_query = """
+    SELECT 
+        status_code,
+        COUNT(*) as count,
+        COUNT(DISTINCT hostname) as hosts,
+        MIN(timestamp) as first_check,
+        MAX(timestamp) as last_check
+    FROM status
+    GROUP BY status_code
+    ORDER BY count DESC, status_code
+    """
+    
+    # Hourly buckets for the time series
+    timeline_query = """
+    SELECT 
+        strftime('%Y-%m-%d %H:00', timestamp) as bucket,
+        status_code,
+        COUNT(*) as count
+    FROM status
+    WHERE status_code IS NOT NULL
+    GROUP BY bucket, status_code
+    """
     
-    # Get all status data
-    query = """
+    # Hour of day (UTC) for the heatmap; rows SQLite cannot date have no hour to go in
+    hourly_query = """
+    SELECT 
+        CAST(strftime('%H', timestamp) AS INTEGER) as hour,
+        status_code,
+        COUNT(*) as count
+    FROM status
+    WHERE status_code IS NOT NULL
+    AND strftime('%H', timestamp) IS NOT NULL
+    GROUP BY hour, status_code
+    """
+    
+    error_query = """
     SELECT hostname, status_code, timestamp, response
     FROM status
+    WHERE status_code >= 400
     ORDER BY timestamp DESC
+    LIMIT 10
     """
     
-    df = pd.read_sql_query(query, conn)
+    # Status codes fit in int16, hours in int8 and per-code counts in int32, which keeps
+    # every frame and pivot below a quarter to half the size of the int64 defaults
+    count_types = {'status_code': 'int16', 'count': 'int32'}
+    summary = pd.read_sql_query(summary_query, conn, dtype={'count': 'int32', 'hosts': 'int32'})
+    timeline = pd.read_sql_query(timeline_query, conn, dtype=count_types,
+                                 parse_dates={'bucket': '%Y-%m-%d %H:%M'})
+    hourly = pd.read_sql_query(hourly_query, conn, dtype={'hour': 'int8', **count_types})
+    
+    # Rows without a status code count towards the total but get no breakdown line
+    status_summary = summary.dropna(subset=['status_code']).astype({'status_code': 'int16'})
+    
+    # Only fetch the error samples (and their response bodies) when the summary shows any
+    if (status_summary['status_code'] >= 400).any():
+        error_responses = pd.read_sql_query(error_query, conn)
+    else:
+        error_responses = pd.DataFrame()
     
     # Prepare the report
     report = []
@@ -106,12 +165,12 @@ def count_status():
     report.append(f"Analysis time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
     # Total records
-    total_records = len(df)
+    total_records = summary['count'].sum()
     report.append(f"Total records in status table: {total_records:,}\n")
     
     # Time range
-    first_check = df['timestamp'].min()
-    last_check = df['timestamp'].max()
+    first_check = summary['first_check'].min()
+    last_check = summary['last_check'].max()
     duration_hours = (pd.to_datetime(last_check) - pd.to_datetime(first_check)).total_seconds() / 3600
     
     report.append("Time Range:")
@@ -120,21 +179,20 @@ def count_status():
     report.append(f"Duration:    {duration_hours:.1f} hours\n")
     
     # Status code breakdown
-    status_counts = df['status_code'].value_counts()
     report.append("Status Code Breakdown:")
-    for status, count in status_counts.items():
+    for status, count in zip(status_summary['status_code'], status_summary['count']):
         percentage = (count / total_records) * 100
         report.append(f"Status {status}: {count:,} ({percentage:.1f}%)")
     
     # Recent error responses
-    error_responses = df[df['status_code'] >= 400].head(10)
     if not error_responses.empty:
         report.append("\nMost Recent Error Responses:")
-        for _, row in error_responses.iterrows():
-            report.append(f"Host: {row['hostname']}")
-            report.append(f"Status: {row['status_code']}")
-            report.append(f"Time: {row['timestamp']}")
-            report.append(f"Response: {row['response']}")
+        # Plain tuples; iterrows would box every row into a Series
+        for hostname, status_code, checked_at, response in error_responses.itertuples(index=False, name=None):
+            report.append(f"Host: {hostname}")
+            report.append(f"Status: {status_code}")
+            report.append(f"Time: {checked_at}")
+            report.append(f"Response: {response}")
             report.append("---")
     
     # Write report to file and print to console
@@ -146,7 +204,7 @@ def count_status():
     
     # Create visualizations
     try:
-        create_visualizations(df, output_dir, timestamp)
+        create_visualizations(status_summary, timeline, hourly, output_dir, timestamp)
         print(f"\nVisualizations saved in {output_dir}/")
     except Exception as e:
         print(f"\nError while creating visualizations: {str(e)}")
@@ -154,4 +212,4 @@ def count_status():
     conn.close()
 
 if __name__ == '__main__':
-    count_status() 
\ No newline at end of file
+    count_status()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from common import DB_PATH, db_connection, decimate_minmax
+
+# Thin long series to two points per pixel column of the 15in, 300 dpi figure
+MAX_PLOT_POINTS = 2 * 15 * 300
+
+# Let Agg simplify and chunk what remains. Long lines get their paths rebuilt when the figure
+# is drawn, so callers hold these with plt.rc_context from plotting through savefig
+TIMELINE_RC = {'path.simplify_threshold': 1.0, 'agg.path.chunksize': 10000}
+
+# Checks per second and status code, with the second as epoch seconds so no timestamp text
+# has to be parsed; rows SQLite cannot date or without a code are left out
+STATUS_QUERY = """
+SELECT
+    CAST(strftime('%s', timestamp) AS INTEGER) as epoch,
+    status_code,
+    COUNT(*) as count
+FROM status
+WHERE strftime('%s', timestamp) IS NOT NULL
+AND status_code IS NOT NULL
+GROUP BY epoch, status_code
+ORDER BY epoch
+"""
+
+# All three columns are plain integers, so rows can go straight into one structured array
+STATUS_ROW = np.dtype([('epoch', np.int64), ('status_code', np.int16), ('count', np.int32)])
+
+def load_status_df(db_path=DB_PATH):
+    """Load per-second status code counts as a time/status_code/count frame."""
+    with db_connection(db_path) as conn:
+        rows = np.fromiter(conn.execute(STATUS_QUERY), dtype=STATUS_ROW)
+    return pd.DataFrame({
+        'time': rows['epoch'].astype('datetime64[s]').astype('datetime64[ns]'),
+        'status_code': rows['status_code'],
+        'count': rows['count'],
+    })
+
+def status_styles(codes):
+    """Label suffix and line style for each status code, worked out for all codes at once."""
+    codes = np.asarray(codes)
+    suffixes = np.select([(codes >= 200) & (codes < 300),
+                          (codes >= 300) & (codes < 400),
+                          (codes >= 400) & (codes < 500),
+                          codes >= 500],
+                         [' (Success)', ' (Redirect)', ' (Client Error)', ' (Server Error)'],
+                         default='')
+    linestyles = np.where(codes < 400, '-', '--')  # Dashed lines for error codes
+    return suffixes, linestyles
+
+def plot_timeline(df, describe_codes=False, highlight_ok=False):
+    """Draw one line per status code from a time/status_code/count frame on the current figure.
+
+    describe_codes adds the status class to each label and dashes the error codes;
+    highlight_ok draws the 200 line thicker.
+    """
+    # groupby hands the groups back in sorted code order, matching the styles
+    codes = np.sort(df['status_code'].unique())
+    suffixes, linestyles = status_styles(codes)
+    if not describe_codes:
+        suffixes[:] = ''
+        linestyles[:] = '-'
+
+    for (code, code_data), suffix, linestyle in zip(df.groupby('status_code', sort=True), suffixes, linestyles):
+        times, counts = decimate_minmax(code_data['time'], code_data['count'], MAX_PLOT_POINTS)
+        plt.plot(times,
+                counts,
+                label=f'Status {code}{suffix}',
+                marker='o' if len(code_data) < 50 else None,  # Only show markers if few points
+                linestyle=linestyle,
+                linewidth=(2 if code == 200 else 1) if highlight_ok else None)
+
+    plt.title('HTTP Status Codes Over Time')
+    plt.xlabel('Time')
+    plt.ylabel('Number of Checks')
+
+def print_timeline_stats(df):
+    """Print the time range and code count of a status timeline frame."""
+    print("\nTime range of data:")
+    print(f"Start: {df['time'].min()}")
+    print(f"End: {df['time'].max()}")
+    print(f"\nTotal unique timestamps: {df['time'].nunique()}")
+    print(f"Total status codes tracked: {df['status_code'].nunique()}")
@@ -1,158 +1,244 @@
 #!/usr/bin/env python3
 
-import sqlite3
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
 import seaborn as sns
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import json
 import numpy as np
+import os
 
-def get_data(db_path='dns_results.db'):
-    conn = sqlite3.connect(db_path)
+from common import db_connection, open_db
+
+# Monitoring snapshot resolution; 150 dpi is plenty for a dashboard PNG and a quarter of
+# the pixels Agg had to fill at 300
+SAVE_DPI = 150
+
+# Window signature and file name of the last snapshot, reused while the window is unchanged
+SNAPSHOT_CACHE = os.path.join('cache', 'last_hour_snapshot.json')
+
+def last_hour_start():
+    """Start of the reporting window, as RFC 3339 UTC text like the resolver writes."""
+    # That text sorts chronologically, so comparing the raw column lets SQLite range-scan its index
+    return (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat(timespec='seconds')
+
+def window_signature(db_path, since):
+    """Row count and newest timestamp of each table within the window."""
+    # Rows are only ever appended, so while these hold no row has entered or left the window;
+    # the file mtime is no use here since every run's ANALYZE touches it
+    signature = []
+    with db_connection(db_path) as conn:
+        for table in ('dns_results', 'status'):
+            signature += conn.execute(f"SELECT COUNT(*), MAX(timestamp) FROM {table} WHERE timestamp > ?",
+                                      (since,)).fetchone()
+    return signature
+
+def cached_snapshot(signature):
+    """File name of the last snapshot if it was drawn from the same window and still exists."""
+    try:
+        with open(SNAPSHOT_CACHE) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('signature') == signature and os.path.exists(cached.get('filename', '')):
+        return cached['filename']
+    return None
+
+def save_snapshot(signature, filename):
+    """Remember which window the snapshot in filename was drawn from."""
+    os.makedirs(os.path.dirname(SNAPSHOT_CACHE), exist_ok=True)
+    with open(SNAPSHOT_CACHE, 'w') as f:
+        json.dump({'signature': signature, 'filename': filename}, f)
+
+def get_data(db_path='dns_results.db', since=None):
+    """Aggregate the last hour of DNS and status results in SQLite; only the summaries come back."""
+    # The range scans rely on idx_dns_ts_success and idx_status_ts, which run_analysis.sh
+    # creates through create_indexes.py; this hourly job only reads
+    conn = open_db(db_path)
+    
+    params = (since or last_hour_start(),)
     
-    # Get current time and time 1 hour ago
-    now = datetime.utcnow()
-    hour_ago = now - timedelta(hours=1)
+    # Checks and successes per 5-minute bucket, as epoch seconds; summed over the buckets
+    # they also give the totals, so the range is scanned once for both
+    buckets_query = """
+    SELECT 
+        CAST(strftime('%s', timestamp) AS INTEGER) / 300 * 300 as bucket,
+        COUNT(*) as total,
+        SUM(success) as successful
+    FROM dns_results
+    WHERE timestamp > ?
+    GROUP BY bucket
+    ORDER BY bucket
+    """
     
-    # Query DNS results
-    dns_query = """
+    # ASNs and busiest IPs; ties go to the one seen first, and the single MIN() makes
+    # SQLite take the bare name columns from that first row. Every ASN comes back so the
+    # group count doubles as the distinct-ASN total
+    asns_query = """
+    SELECT 
+        asn,
+        COUNT(*) as count,
+        MIN(timestamp) as first_seen,
+        as_name
+    FROM dns_results
+    WHERE timestamp > ?
+    AND asn IS NOT NULL
+    GROUP BY asn
+    ORDER BY count DESC, first_seen
+    """
+    top_ips_query = """
     SELECT 
-        hostname,
         ip_address,
+        COUNT(*) as count,
+        MIN(timestamp) as first_seen,
         asn,
-        as_name,
-        timestamp,
-        success
+        as_name
     FROM dns_results
-    WHERE datetime(timestamp) > datetime(?)
-    ORDER BY timestamp
+    WHERE timestamp > ?
+    AND ip_address IS NOT NULL
+    GROUP BY ip_address
+    ORDER BY count DESC, first_seen
+    LIMIT 5
     """
     
-    # Query status results
+    # Query status results per code; rows without a code only count towards the total
     status_query = """
     SELECT 
-        hostname,
         status_code,
-        path,
-        timestamp
+        COUNT(*) as count,
+        MIN(timestamp) as first_seen
     FROM status
-    WHERE datetime(timestamp) > datetime(?)
-    ORDER BY timestamp
+    WHERE timestamp > ?
+    GROUP BY status_code
+    ORDER BY count DESC, first_seen
     """
     
-    # Load data into pandas
-    dns_df = pd.read_sql_query(dns_query, conn, params=(hour_ago.isoformat(),))
-    status_df = pd.read_sql_query(status_query, conn, params=(hour_ago.isoformat(),))
+    buckets = pd.read_sql_query(buckets_query, conn, params=params)
+    asns = pd.read_sql_query(asns_query, conn, params=params, index_col='asn')
+    dns_stats = {
+        'total': int(buckets['total'].sum()),
+        'successful': int(buckets['successful'].sum()),
+        'unique_asns': len(asns),
+        'top_asns': asns.head(10),
+        'top_ips': pd.read_sql_query(top_ips_query, conn, params=params, index_col='ip_address'),
+    }
+    # Rows SQLite cannot date count towards the totals but have no bucket to plot in
+    buckets = buckets.dropna(subset=['bucket'])
+    dns_stats['success_rate'] = pd.Series((buckets['successful'] / buckets['total']).to_numpy(dtype=float),
+                                          name='success',
+                                          index=pd.to_datetime(buckets['bucket'], unit='s', utc=True)
+                                          .rename('minute_group'))
     
-    # Convert timestamps
-    dns_df['timestamp'] = pd.to_datetime(dns_df['timestamp'])
-    status_df['timestamp'] = pd.to_datetime(status_df['timestamp'])
-    
-    # Convert success to float for proper aggregation
-    dns_df['success'] = dns_df['success'].astype(float)
+    status_counts = pd.read_sql_query(status_query, conn, params=params)
+    status_stats = {
+        'total': int(status_counts['count'].sum()),
+        'counts': status_counts.dropna(subset=['status_code'])
+                               .astype({'status_code': int})
+                               .set_index('status_code')['count'],
+    }
     
     conn.close()
-    return dns_df, status_df
+    return dns_stats, status_stats
 
-def create_visualizations(dns_df, status_df):
+def create_visualizations(dns_stats, status_stats):
     # Create a figure with multiple subplots
     plt.style.use('default')
-    fig = plt.figure(figsize=(15, 10))
+    fig = plt.figure(figsize=(15, 10), layout='constrained')
     
     # 1. DNS Resolution Success Rate Over Time
     ax1 = plt.subplot(2, 2, 1)
-    # Group by 5-minute intervals and calculate mean
-    dns_df['minute_group'] = dns_df['timestamp'].dt.floor('5min')
-    success_rate = dns_df.groupby('minute_group')['success'].mean()
-    success_rate.plot(ax=ax1, marker='o', linestyle='-', color='blue')
+    dns_stats['success_rate'].plot(ax=ax1, marker='o', linestyle='-', color='blue')
     ax1.set_title('DNS Resolution Success Rate (5-minute intervals)')
     ax1.set_ylabel('Success Rate')
     ax1.grid(True)
     
     # 2. Status Code Distribution
     ax2 = plt.subplot(2, 2, 2)
-    status_codes = status_df['status_code'].value_counts()
-    status_codes.plot(kind='bar', ax=ax2, color='green')
+    status_stats['counts'].plot(kind='bar', ax=ax2, color='green')
     ax2.set_title('HTTP Status Code Distribution')
     ax2.set_xlabel('Status Code')
     ax2.set_ylabel('Count')
     
     # 3. ASN Distribution (Top 10)
     ax3 = plt.subplot(2, 2, 3)
-    asn_counts = dns_df[dns_df['asn'].notna()]['asn'].value_counts().head(10)
-    asn_counts.plot(kind='barh', ax=ax3, color='orange')
+    dns_stats['top_asns']['count'].plot(kind='barh', ax=ax3, color='orange')
     ax3.set_title('Top 10 ASNs')
     ax3.set_xlabel('Count')
     
     # 4. Top 5 IP Addresses
     ax4 = plt.subplot(2, 2, 4)
-    ip_counts = dns_df[dns_df['ip_address'].notna()]['ip_address'].value_counts().head(5)
-    colors = plt.cm.Set3(np.linspace(0, 1, len(ip_counts)))
+    top_ips = dns_stats['top_ips']
+    colors = plt.cm.Set3(np.linspace(0, 1, len(top_ips)))
     
-    bars = ip_counts.plot(kind='barh', ax=ax4, color=colors)
+    bars = top_ips['count'].plot(kind='barh', ax=ax4, color=colors)
     ax4.set_title('Top 5 IP Addresses')
     ax4.set_xlabel('Count')
     
-    # Add ASN information to the IP address labels
-    labels = []
-    for ip in ip_counts.index:
-        ip_data = dns_df[dns_df['ip_address'] == ip].iloc[0]
-        asn = ip_data['asn'] if pd.notna(ip_data['asn']) else 'Unknown ASN'
-        as_name = ip_data['as_name'] if pd.notna(ip_data['as_name']) else 'Unknown Provider'
-        labels.append(f"{ip}\n{asn}\n{as_name[:30]}")
-    ax4.set_yticklabels(labels)
+    # Add ASN information to the IP address labels, taken from each IP's first row
+    labels = (top_ips.index.to_series() + '\n'
+              + top_ips['asn'].fillna('Unknown ASN') + '\n'
+              + top_ips['as_name'].fillna('Unknown Provider').str.slice(0, 30))
+    ax4.set_yticklabels(labels.tolist())
     
     # Generate timestamp for filename
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f'last_hour_analysis_{timestamp}.png'
     
-    plt.tight_layout()
-    plt.savefig(filename, bbox_inches='tight', dpi=300)
+    plt.savefig(filename, bbox_inches='tight', dpi=SAVE_DPI)
     plt.close()
     return filename
 
-def main():
+def main(db_path='dns_results.db'):
     try:
+        # Nothing to redraw if no row has entered or left the window since the last snapshot
+        since = last_hour_start()
+        signature = window_signature(db_path, since)
+        filename = cached_snapshot(signature)
+        if filename:
+            print(f"No new results in the last hour; '{filename}' is up to date")
+            return
+        
         print("Fetching data from the last hour...")
-        dns_df, status_df = get_data()
+        dns_stats, status_stats = get_data(db_path, since)
         
         print("\nDNS Resolution Statistics:")
-        print(f"Total DNS queries: {len(dns_df)}")
-        print(f"Successful resolutions: {int(dns_df['success'].sum())}")
-        print(f"Unique ASNs found: {dns_df['asn'].nunique()}")
+        print(f"Total DNS queries: {dns_stats['total']}")
+        print(f"Successful resolutions: {int(dns_stats['successful'])}")
+        print(f"Unique ASNs found: {dns_stats['unique_asns']}")
         
-        if len(dns_df) > 0:
+        if dns_stats['total'] > 0:
             print("\nTop ASNs:")
-            top_asns = dns_df[dns_df['asn'].notna()].groupby('asn')['hostname'].count().sort_values(ascending=False).head(5)
-            for asn, count in top_asns.items():
-                as_name = dns_df[dns_df['asn'] == asn]['as_name'].iloc[0]
+            top_asns = dns_stats['top_asns'].head(5)
+            for asn, count, as_name in zip(top_asns.index, top_asns['count'], top_asns['as_name']):
                 print(f"- {asn} ({as_name}): {count} hostnames")
             
             print("\nTop 5 IP Addresses:")
-            top_ips = dns_df[dns_df['ip_address'].notna()]['ip_address'].value_counts().head(5)
-            for ip, count in top_ips.items():
-                ip_data = dns_df[dns_df['ip_address'] == ip].iloc[0]
-                asn = ip_data['asn'] if pd.notna(ip_data['asn']) else 'Unknown ASN'
-                as_name = ip_data['as_name'] if pd.notna(ip_data['as_name']) else 'Unknown Provider'
+            top_ips = dns_stats['top_ips']
+            for ip, count, asn, as_name in zip(top_ips.index, top_ips['count'], top_ips['asn'], top_ips['as_name']):
+                asn = asn if pd.notna(asn) else 'Unknown ASN'
+                as_name = as_name if pd.notna(as_name) else 'Unknown Provider'
                 print(f"- {ip} ({asn} - {as_name}): {count} hostnames")
         
+        status_counts = status_stats['counts']
         print("\nHTTP Check Statistics:")
-        print(f"Total HTTP checks: {len(status_df)}")
-        print(f"Successful checks (200): {len(status_df[status_df['status_code'] == 200])}")
-        print(f"Unique status codes: {status_df['status_code'].nunique()}")
+        print(f"Total HTTP checks: {status_stats['total']}")
+        print(f"Successful checks (200): {status_counts.get(200, 0)}")
+        print(f"Unique status codes: {len(status_counts)}")
         
-        if len(status_df) > 0:
+        if status_stats['total'] > 0:
             print("\nStatus Code Distribution:")
-            status_counts = status_df['status_code'].value_counts()
             for status_code, count in status_counts.items():
                 print(f"- Status {status_code}: {count} responses")
         
         print("\nCreating visualizations...")
-        filename = create_visualizations(dns_df, status_df)
+        filename = create_visualizations(dns_stats, status_stats)
+        save_snapshot(signature, filename)
         print(f"Visualizations saved as '{filename}'")
         
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
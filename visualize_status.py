@@ -1,51 +1,23 @@
 #!/usr/bin/env python3
 
-import sqlite3
+import matplotlib
+matplotlib.use('Agg')  # Render straight to files; no display needed
 import matplotlib.pyplot as plt
-from datetime import datetime
 
-# Connect to database
-conn = sqlite3.connect('dns_results.db')
-cursor = conn.cursor()
+from status_viz import load_status_df, plot_timeline
 
 # Get data
-cursor.execute("""
-    SELECT datetime(timestamp) as time, status_code, COUNT(*) as count 
-    FROM status 
-    GROUP BY datetime(timestamp), status_code 
-    ORDER BY datetime(timestamp)
-""")
-data = cursor.fetchall()
-
-# Organize data by status code
-status_codes = {}
-for time, code, count in data:
-    if code not in status_codes:
-        status_codes[code] = {'times': [], 'counts': []}
-    status_codes[code]['times'].append(datetime.strptime(time, '%Y-%m-%d %H:%M:%S'))
-    status_codes[code]['counts'].append(count)
+df = load_status_df()
 
 # Create plot
-plt.figure(figsize=(15, 8))
+plt.figure(figsize=(15, 8), layout='constrained')
 
 # Plot each status code
-for code in sorted(status_codes.keys()):
-    plt.plot(status_codes[code]['times'], 
-             status_codes[code]['counts'],
-             label=f'Status {code}',
-             marker='o' if len(status_codes[code]['times']) < 50 else None)
-
-plt.title('HTTP Status Codes Over Time')
-plt.xlabel('Time')
-plt.ylabel('Number of Checks')
+plot_timeline(df)
 plt.legend()
 plt.grid(True)
 plt.xticks(rotation=45)
-plt.tight_layout()
 
 # Save plot
 plt.savefig('status_timeline.png')
 print("Plot saved as status_timeline.png")
-
-# Close connection
-conn.close() 
\ No newline at end of file